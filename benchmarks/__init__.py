@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+from typing import Callable, Dict, List, Tuple
+import time
+import json
+import queue
+import resource
+import multiprocessing
+import numpy as np
+
+
+"""
+Замеры производительности прямой модели и обработки сцен.
+Запуск: python -m benchmarks [--filter ...] [--save baseline.json] [--compare baseline.json]
+"""
+
+
+# зарегистрированные замеры: имя -> функция подготовки, возвращающая (вызываемый объект, объем работы)
+registry = {}
+
+
+def case(name: str) -> Callable:
+    """
+    Регистрация замера. Функция подготовки вызывается один раз, вне замера времени
+    """
+    def decorator(setup: Callable[[], Tuple[Callable, int]]) -> Callable:
+        registry[name] = setup
+        return setup
+    return decorator
+
+
+def __reset_peak_rss() -> bool:
+    """
+    Сброс пикового RSS процесса до текущего (Linux). :return: False, если сброс не поддерживается
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as file:
+            file.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def __peak_rss_mb(reset: bool) -> float:
+    """
+    :param reset: пиковый RSS был сброшен (см. __reset_peak_rss)
+    :return: пиковый RSS процесса, МБ: после сброса - из /proc/self/status (VmHWM), иначе - за все время работы
+    """
+    if reset:
+        with open('/proc/self/status') as file:
+            for line in file:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.
+
+
+def __measure(name: str, repeat: int, queue: multiprocessing.Queue) -> None:
+    try:
+        func, work = registry[name]()
+        func()     # прогрев (кэши, ленивая инициализация)
+        # пиковый RSS - только за время замеряемых вызовов (без подготовки сцены), если ОС позволяет
+        reset = __reset_peak_rss()
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            times.append(time.perf_counter() - start)
+        queue.put({'name': name, 'best': min(times), 'mean': float(np.mean(times)), 'repeat': repeat,
+                   'peak_rss_mb': __peak_rss_mb(reset),
+                   'throughput': work / min(times)})
+    except Exception as e:
+        queue.put({'name': name, 'error': '{}: {}'.format(type(e).__name__, e)})
+
+
+def measure(name: str, repeat: int = 3, timeout: float = None) -> Dict:
+    """
+    Замер в отдельном процессе, чтобы пиковое потребление памяти (RSS) относилось только к данному замеру
+
+    :param name: имя замера
+    :param repeat: число повторений (время - лучшее и среднее по повторениям)
+    :param timeout: макс. время замера, с (по истечении процесс завершается). По умолчанию - без ограничения
+    :return: словарь: время (с), пиковый RSS за время замеряемых вызовов (МБ), производительность (столбцы x уровни x частоты в секунду).
+        Если процесс завершился аварийно (например, по нехватке памяти) или не уложился в timeout -
+        словарь с ключом 'error'
+    """
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    process = context.Process(target=__measure, args=(name, repeat, results))
+    process.start()
+    start = time.perf_counter()
+    out = None
+    while out is None:
+        try:
+            out = results.get(timeout=1.)
+        except queue.Empty:
+            if not process.is_alive():
+                # результат мог быть помещен в очередь непосредственно перед завершением процесса
+                try:
+                    out = results.get(timeout=1.)
+                except queue.Empty:
+                    out = {'name': name, 'error': 'process exited with code {}'.format(process.exitcode)}
+            elif timeout is not None and time.perf_counter() - start > timeout:
+                process.terminate()
+                out = {'name': name, 'error': 'timeout ({} s)'.format(timeout)}
+    process.join()
+    return out
+
+
+def run(names: List[str] = None, repeat: int = 3, verbose: bool = True,
+        baseline: Dict[str, Dict] = None, timeout: float = None) -> Dict[str, Dict]:
+    """
+    Выполнить замеры
+
+    :param names: имена замеров. По умолчанию - все
+    :param repeat: число повторений
+    :param verbose: вывод результатов по мере выполнения
+    :param baseline: сохраненные результаты для вывода относительного времени (см. load)
+    :param timeout: макс. время одного замера, с
+    :return: словарь {имя: результат замера}
+    """
+    import benchmarks.cases  # регистрация замеров
+    baseline = baseline or {}
+    results = {}
+    for name in (list(registry.keys()) if names is None else names):
+        results[name] = measure(name, repeat, timeout)
+        if verbose:
+            print(format_result(results[name], baseline.get(name)), flush=True)
+    return results
+
+
+def format_result(r: Dict, baseline: Dict = None) -> str:
+    if 'error' in r:
+        return '{:<64} ERROR {}'.format(r['name'], r['error'])
+    s = '{:<64} {:>10.4f} s {:>9.1f} MB {:>12.3e} /s'.format(r['name'], r['best'], r['peak_rss_mb'], r['throughput'])
+    if baseline is not None and 'best' in baseline:
+        s += '  x{:.2f}'.format(r['best'] / baseline['best'])
+    return s
+
+
+def save(path: str, results: Dict[str, Dict]) -> None:
+    with open(path, 'w') as file:
+        json.dump(results, file, indent=1)
+
+
+def load(path: str) -> Dict[str, Dict]:
+    with open(path, 'r') as file:
+        return json.load(file)
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float = 0.2) -> List[str]:
+    """
+    Сравнение с сохраненными результатами
+
+    :param tolerance: допустимое относительное увеличение времени
+    :return: имена замеров, для которых время увеличилось больше, чем на tolerance
+    """
+    regressions = []
+    for name, r in results.items():
+        b = baseline.get(name)
+        if b is None or 'best' not in b or 'best' not in r:
+            continue
+        if r['best'] > b['best'] * (1. + tolerance):
+            regressions.append(name)
+    return regressions
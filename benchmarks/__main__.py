@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+import sys
+import argparse
+import benchmarks
+import benchmarks.cases
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='python -m benchmarks')
+    parser.add_argument('--filter', default='', help='выполнить только замеры, имена которых содержат строку')
+    parser.add_argument('--repeat', type=int, default=3, help='число повторений')
+    parser.add_argument('--save', default=None, help='сохранить результаты в JSON-файл')
+    parser.add_argument('--compare', default=None, help='сравнить с результатами из JSON-файла')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='допустимое относительное увеличение времени')
+    parser.add_argument('--timeout', type=float, default=None, help='макс. время одного замера, с')
+    parser.add_argument('--list', action='store_true', help='вывести имена замеров')
+    args = parser.parse_args()
+
+    names = [name for name in benchmarks.registry if args.filter in name]
+    if args.list:
+        print('\n'.join(names))
+        sys.exit(0)
+
+    baseline = benchmarks.load(args.compare) if args.compare else {}
+    results = benchmarks.run(names, args.repeat, baseline=baseline, timeout=args.timeout)
+
+    if args.save:
+        benchmarks.save(args.save, results)
+    if args.compare:
+        regressions = benchmarks.compare(results, baseline, args.tolerance)
+        if regressions:
+            print('\nRegressions (>{:.0f}%):'.format(args.tolerance * 100))
+            print('\n'.join(regressions))
+            sys.exit(1)
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+import copy
+import numpy as np
+from benchmarks import case
+from benchmarks import scenes
+from cpu.core import attenuation
+import cpu.core.integrate as integrate
+import cpu.satellite as satellite
+from cpu.utils import map2d
+from cpu import retrieval
+
+
+"""
+Набор замеров: каждая функция с декоратором case возвращает пару (вызываемый объект, объем работы
+в единицах столбцы x уровни x частоты)
+"""
+
+
+F = len(scenes.frequencies)
+
+
+for _approx in [True, False]:
+    @case('attenuation.oxygen[levels=500,approx={}]'.format(_approx))
+    def _(approx=_approx):
+        atm = scenes.standard(500)
+        T, P, rho = atm.temperature[None, :], atm.pressure[None, :], atm.absolute_humidity[None, :]
+        f = scenes.frequencies[:, None]
+        return lambda: attenuation.oxygen(f, T, P, rho, approx), 500 * F
+
+    @case('attenuation.water_vapor[levels=500,approx={}]'.format(_approx))
+    def _(approx=_approx):
+        atm = scenes.standard(500)
+        T, P, rho = atm.temperature[None, :], atm.pressure[None, :], atm.absolute_humidity[None, :]
+        f = scenes.frequencies[:, None]
+        return lambda: attenuation.water_vapor(f, T, P, rho, approx), 500 * F
+
+
+@case('attenuation.liquid_water[300x300x100]')
+def _():
+    atm = scenes.cloudy()
+    w = atm.liquid_water
+    return lambda: attenuation.liquid_water(22.2, atm.temperature, w), w.size
+
+
+@case('integrate.full[300x300x100]')
+def _():
+    w = scenes.cloudy().liquid_water
+    return lambda: integrate.full(w, 0.1, 'trapz'), w.size
+
+
+@case('integrate.cumulative[300x300x100]')
+def _():
+    w = scenes.cloudy().liquid_water
+    return lambda: integrate.cumulative(w, 0.1, 'trapz', 'up'), w.size
+
+
+@case('integrate.full[300x300x100,theta=30]')
+def _():
+    w = scenes.cloudy().liquid_water
+    return lambda: integrate.full(w, 0.1, 'trapz', np.radians(30.), 50.), w.size
+
+
+for _levels in [100, 500, 2000]:
+    for _approx in [True, False]:
+        @case('downward.brightness_temperature[levels={},approx={}]'.format(_levels, _approx))
+        def _(levels=_levels, approx=_approx):
+            atm = scenes.standard(levels, approx=approx)
+            return lambda: atm.downward.brightness_temperature(scenes.frequencies), levels * F
+
+        @case('upward.brightness_temperature[levels={},approx={}]'.format(_levels, _approx))
+        def _(levels=_levels, approx=_approx):
+            atm = scenes.standard(levels, approx=approx)
+            return lambda: atm.upward.brightness_temperature(scenes.frequencies), levels * F
+
+        @case('satellite.brightness_temperature[levels={},approx={}]'.format(_levels, _approx))
+        def _(levels=_levels, approx=_approx):
+            atm, srf = scenes.standard(levels, approx=approx), scenes.surface()
+            return lambda: satellite.brightness_temperature(scenes.frequencies, atm, srf), levels * F
+
+
+for _memo_size in [0, 16]:
+    @case('satellite.brightness_temperature[cloud sweep,levels=500,memo_size={}]'.format(_memo_size))
+    def _(memo_size=_memo_size):
+        # между вызовами меняется только водность: с кэшем пересчитывается только поглощение в облаках
+        atm, srf = scenes.standard(500, approx=False, memo_size=memo_size), scenes.surface()
+        k = np.arange(500)
+        clouds = [np.where((k > 50) & (k < 50 + 10 * i), 0.3, 0.).astype(np.float32) for i in range(1, 11)]
+
+        def sweep():
+            for w in clouds:
+                atm.liquid_water = w
+                satellite.brightness_temperature(scenes.frequencies, atm, srf)
+        return sweep, 500 * F * len(clouds)
+
+
+@case('satellite.brightness_temperature[300x300x100]')
+def _():
+    atm, srf = scenes.cloudy(), scenes.surface()
+    return lambda: satellite.brightness_temperature(scenes.frequencies, atm, srf), atm.liquid_water.size * F
+
+
+@case('satellite.brightness_temperature[300x300x100,theta=30]')
+def _():
+    atm = copy.copy(scenes.cloudy())
+    atm.angle = np.radians(30.)
+    srf = scenes.surface(atm.angle)
+    return lambda: satellite.brightness_temperature(scenes.frequencies, atm, srf), atm.liquid_water.size * F
+
+
+@case('satellite.jacobian[levels=100]')
+def _():
+    atm, srf = scenes.standard(100), scenes.surface()
+    return lambda: satellite.jacobian(scenes.frequencies, atm, srf), 100 * F
+
+
+@case('Plank3D.generate_clouds[300x300,30%]')
+def _():
+    return lambda: scenes.clouds(300, 0.3), 300 * 300
+
+
+@case('Plank3D.height_map2d_[300x300,30%]')
+def _():
+    p, clouds = scenes.plank(), scenes.clouds(300, 0.3)
+    return lambda: p.height_map2d_(clouds), 300 * 300
+
+
+@case('Plank3D.liquid_water_[300x300x100]')
+def _():
+    p, hmap = scenes.plank(), scenes.height_map()
+    return lambda: p.liquid_water_(hmap), 300 * 300 * 100
+
+
+@case('map2d.conv_averaging[300x300,kernels=6..294]')
+def _():
+    hmap = scenes.height_map()
+    kernels = list(range(6, 295, 6))
+    return lambda: [map2d.conv_averaging(hmap, kernel) for kernel in kernels], 300 * 300 * len(kernels)
+
+
+@case('retrieval.Coefficients.retrieve[300x300]')
+def _():
+    atm, srf = scenes.standard(100), scenes.surface()
+    coefficients = retrieval.Coefficients(atm, srf, scenes.frequencies)
+    tb = satellite.brightness_temperature(scenes.frequencies, scenes.cloudy(), srf)
+    tb = np.moveaxis(np.asarray(tb), -1, 0)
+    return lambda: coefficients.retrieve(tb), 300 * 300 * F
+
+
+@case('retrieval.optimal_estimation[100 columns]')
+def _():
+    atm, srf = scenes.standard(40, H=10.), scenes.surface()
+    prior = retrieval.Prior.standard(atm)
+    rs = np.random.RandomState(42)
+    tb = satellite.brightness_temperature(scenes.frequencies, atm, srf) + rs.randn(100, F)
+    return lambda: retrieval.optimal_estimation(tb, scenes.frequencies, atm, srf, prior, max_iter=10), 100 * 40 * F
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+from functools import lru_cache
+import numpy as np
+from cpu.atmosphere import Atmosphere
+from cpu.surface import SmoothWaterSurface
+from cpu.cloudiness import Plank3D
+
+
+"""
+Опорные сцены для замеров производительности (фиксированные параметры и seed)
+"""
+
+
+frequencies = np.asarray([22.2, 27.2, 36., 89.])
+
+# распределение L2, высота нижней границы облаков 1.2192 км
+L2 = {'alpha': 1.411, 'Dm': 4.026, 'dm': 0.02286, 'eta': 0.93, 'beta': 0.3, 'cl_bottom': 1.2192}
+
+
+def standard(levels: int = 500, H: float = 10., approx: bool = True, memo_size: int = 0) -> Atmosphere:
+    """
+    Стандартная атмосфера (1D-профили) с заданным числом узлов по высоте.
+    По умолчанию кэш результатов отключен (см. Atmosphere.memo_size), иначе после прогрева
+    замеры измеряли бы только обращение к кэшу
+    """
+    atm = Atmosphere.Standard(H=H, dh=H / levels)
+    atm.approx = approx
+    atm.memo_size = memo_size
+    return atm
+
+
+def surface(theta: float = 0.) -> SmoothWaterSurface:
+    srf = SmoothWaterSurface(temperature=15., salinity=0.)
+    srf.angle = theta
+    return srf
+
+
+def plank(res: int = 300, levels: int = 100, X: float = 50., H: float = 10.) -> Plank3D:
+    return Plank3D(kilometers=(X, X, H), nodes=(res, res, levels), clouds_bottom=L2['cl_bottom'])
+
+
+def K(percentage: float = 0.3, X: float = 50.) -> float:
+    """
+    Нормировочный коэффициент распределения L2 для заданной доли покрытия неба
+    """
+    alpha, Dm, dm = L2['alpha'], L2['Dm'], L2['dm']
+    xi = -np.exp(-alpha * Dm) * (((alpha * Dm) ** 2) / 2 + alpha * Dm + 1) + \
+        np.exp(-alpha * dm) * (((alpha * dm) ** 2) / 2 + alpha * dm + 1)
+    return 2 * np.power(alpha, 3) * (X * X * percentage) / (np.pi * xi)
+
+
+def clouds(res: int = 300, percentage: float = 0.3, seed: int = 42) -> list:
+    return plank(res).generate_clouds(Dm=L2['Dm'], dm=L2['dm'], K=K(percentage), alpha=L2['alpha'],
+                                      beta=L2['beta'], eta=L2['eta'], seed=seed, timeout=30., verbose=False)
+
+
+@lru_cache(maxsize=None)
+def height_map(res: int = 300, percentage: float = 0.3, seed: int = 42) -> np.ndarray:
+    return plank(res).height_map2d_(clouds(res, percentage, seed))
+
+
+@lru_cache(maxsize=None)
+def cloudy(res: int = 300, levels: int = 100, percentage: float = 0.3, seed: int = 42) -> Atmosphere:
+    """
+    Стандартная атмосфера с 3D-полем водности Plank3D (res x res x levels)
+    """
+    atm = standard(levels)
+    atm.liquid_water = plank(res, levels).liquid_water_(height_map(res, percentage, seed))
+    atm.horizontal_extent = 50.
+    return atm
@@ -1,14 +1,19 @@
 #  -*- coding: utf-8 -*-
-from typing import Tuple, Union, List
+from typing import Tuple, Union, List, Callable
 from functools import wraps
+import threading
+from collections import OrderedDict
+import copy
 from cpu.core.types import Tensor1D_or_3D, Tensor1D_or_2D, Tensor2D, cpu_float
 from cpu.core.const import *
 import cpu.core.math as math
-from cpu.core.common import at, cx
+from cpu.core.common import at
 from cpu.core import attenuation
 from cpu.core.static.water import vapor
 import cpu.core.integrate as integrate
+from cpu.core.profiling import profiled
 from cpu.core.multi import parallel
+from cpu.cloudiness import SparseLiquidWater
 import numpy as np
 
 
@@ -21,6 +26,78 @@ def atmospheric(method):
     return wrapper
 
 
+# глубина вложенности вызовов, результаты которых распространяются на 2D-сетку (см. planar)
+_nested = threading.local()
+
+
+def planar(*fields: str):
+    """
+    Горизонтально однородные 3D-поля T, P, rho хранятся как 1D-профили (см. Atmosphere._profile).
+    Если от таких профилей зависит результат, он распространяется на исходную 2D-сетку, так что форма
+    результата совпадает с расчетом по 3D-полям. Вложенные вызовы (внутри расчета) не распространяются
+
+    :param fields: поля, от которых зависит результат. По умолчанию - T, P, rho и водность
+    """
+    fields = fields or ('_T', '_P', '_rho', '_w')
+
+    def decorator(method):
+        @wraps(method)
+        def wrapper(obj: 'Atmosphere', *args, **kwargs):
+            atm = getattr(obj, 'outer', obj)
+            if atm._shape is None or getattr(_nested, 'depth', 0):
+                return method(obj, *args, **kwargs)
+            _nested.depth = 1
+            try:
+                out = method(obj, *args, **kwargs)
+            finally:
+                _nested.depth = 0
+            if any(len(np.shape(getattr(atm, name))) >= 3 for name in fields):
+                return out
+            return atm._planar(out)
+        return wrapper
+    return decorator
+
+
+def spectral(method):
+    """
+    Векторизация по частотам. Массив частот обрабатывается частями так, чтобы число элементов
+    (узлы сетки x частоты) в одном проходе не превышало Atmosphere.chunk_size.
+    Результат имеет последнюю (частотную) ось
+    """
+    @wraps(method)
+    def wrapper(obj: 'Atmosphere', frequency: Union[float, np.ndarray, List[float]], *args, **kwargs):
+        if math.rank(frequency) == 0:
+            return method(obj, frequency, *args, **kwargs)
+        frequency = math.as_tensor(frequency)
+        n = obj.frequency_chunk
+        if len(frequency) <= n:
+            return method(obj, frequency, *args, **kwargs)
+        parts = [method(obj, frequency[i:i + n], *args, **kwargs) for i in range(0, len(frequency), n)]
+        if isinstance(parts[0], tuple):
+            return tuple(np.concatenate(part, axis=-1) for part in zip(*parts))
+        return np.concatenate(parts, axis=-1)
+    return wrapper
+
+
+def columnar(method):
+    """
+    Расчет только для уникальных вертикальных столбцов 3D-полей (см. Atmosphere.unique_columns).
+    Результаты для одинаковых столбцов (например, безоблачных или облаков одной мощности)
+    вычисляются один раз и затем распределяются по 2D-карте
+    """
+    @wraps(method)
+    def wrapper(obj: 'Atmosphere', *args, **kwargs):
+        columns = obj._columns()
+        if columns is None:
+            return method(obj, *args, **kwargs)
+        atm, inverse, shape = columns
+        out = method(atm, *args, **kwargs)
+        if isinstance(out, tuple):
+            return tuple(a[:, 0][inverse].reshape(shape + a.shape[2:]) for a in out)
+        return out[:, 0][inverse].reshape(shape + out.shape[2:])
+    return wrapper
+
+
 class Atmosphere:
     def __init__(self, Temperature: Tensor1D_or_3D, Pressure: Tensor1D_or_3D,
                  AbsoluteHumidity: Tensor1D_or_3D = None, RelativeHumidity: Tensor1D_or_3D = None,
@@ -34,11 +111,24 @@ class Atmosphere:
             если указан RelativeHumidity
         :param RelativeHumidity: относительная влажность (1D или 3D), %. Параметр может быть не указан,
             если указан AbsoluteHumidity
-        :param LiquidWater: 1D-профиль или 3D-поле водности, кг/м^3. Параметр может быть не указан.
+        :param LiquidWater: 1D-профиль или 3D-поле водности, кг/м^3 (в т.ч. в компактном представлении
+            cloudiness.SparseLiquidWater). Параметр может быть не указан.
         :param altitudes: соответствующие высоты (1D массив), км. Может быть не указан, если указан параметр dh.
             Не может включать высоту h=0
         :param dh: постоянный шаг по высоте, км. Может быть не указан, если указаны altitudes
+
+        Горизонтально однородные 3D-поля температуры, давления и влажности хранятся как 1D-профили
         """
+        # кэш результатов по частотам (см. _memoized): величины, зависящие только от T, P, rho и сетки,
+        # и величины, зависящие также от водности
+        self._gas_memo, self._liquid_memo = OrderedDict(), OrderedDict()
+        self.memo_size = 16   # макс. число частот (массивов частот) в кэше; 0 - без кэширования
+        self.memo_bytes = 2 ** 27   # макс. объем массивов в каждом из кэшей (газ, водность), байт
+        self._columns_memo = {}   # уникальные столбцы 3D-полей (см. _columns), не зависят от частоты
+
+        self._shape = None   # форма 2D-сетки, если поля T, P или rho заданы в 3D
+        self._fields = {}    # исходные 3D-поля, хранящиеся как 1D-профили (см. _store)
+
         self._T = math.as_tensor(Temperature)
         del Temperature
 
@@ -52,6 +142,8 @@ class Atmosphere:
         del AbsoluteHumidity
 
         assert self._T.shape == self._P.shape == self._rho.shape, 'dimensions must match'
+        self._T, self._P, self._rho = \
+            self._store('T', self._T), self._store('P', self._P), self._store('rho', self._rho)
 
         if altitudes is None and dh is None:
             raise ValueError('please specify altitudes or dh')
@@ -68,8 +160,9 @@ class Atmosphere:
         del dh
 
         if LiquidWater is None:
-            LiquidWater = math.zeros_like(self._T)
-        self._w = math.as_tensor(LiquidWater)   # распределение жидкокапельной влаги 1D или 3D
+            LiquidWater = math.zeros_like(self._T) if self._shape is None else \
+                math.zeros(self._shape + self._T.shape[-1:])
+        self.liquid_water = LiquidWater   # распределение жидкокапельной влаги 1D или 3D
         del LiquidWater
 
         self._tcl = -2  # оценка на эффективную температуру облачности по Цельсию
@@ -77,13 +170,19 @@ class Atmosphere:
         self._PX = 50.  # горизонтальная протяженность в километрах
         self.incline = 'left'     # наклон траектории наблюдения (left/right) - учитывается, если theta != 0
         self.integration_method = 'trapz'   # метод интегрирования
+        self.solver = 'cumulative'   # решение уравнения переноса: 'cumulative' - за O(N), 'direct' - за O(N^2)
         self._use_tcl = False   # в расчетах использовать эффективную температуру облаков
         self.T_cosmic = 2.7    # температура реликтового фона в К
-        self.approx = True    # вычисление коэффициентов затухания по приближенным формулам
+        self._approx = True    # вычисление коэффициентов затухания по приближенным формулам
+        self._table = None    # таблица коэффициентов поглощения (core.tables.AbsorptionTable) вместо формул
+        self.chunk_size = 2 ** 24   # макс. число элементов (узлы x частоты) при векторизации по частотам
+        self.unique_columns = True   # для 3D-полей при theta = 0 - расчет только по уникальным столбцам
 
         for name, value in kwargs.items():
             self.__setattr__(name, value)
 
+        self._shear_tables = {}   # таблицы перехода к наклонной сетке (см. _shear_table)
+
         self.attenuation = Atmosphere.attenuation(self)
         self.opacity = Atmosphere.opacity(self)
         self.downward = Atmosphere.downward(self)
@@ -91,43 +190,98 @@ class Atmosphere:
 
     @property
     def temperature(self) -> Tensor1D_or_3D:
-        return self._T
+        return self._fields.get('T', self._T)
 
     @temperature.setter
     def temperature(self, val: Tensor1D_or_3D):
-        self._T = math.as_tensor(val)
+        self._T = self._store('T', val)
+        self._invalidate()
 
     @property
     def pressure(self) -> Tensor1D_or_3D:
-        return self._P
+        return self._fields.get('P', self._P)
 
     @pressure.setter
     def pressure(self, val: Tensor1D_or_3D):
-        self._P = math.as_tensor(val)
+        self._P = self._store('P', val)
+        self._invalidate()
 
     @property
     def absolute_humidity(self) -> Tensor1D_or_3D:
-        return self._rho
+        return self._fields.get('rho', self._rho)
 
     @absolute_humidity.setter
     def absolute_humidity(self, val: Tensor1D_or_3D):
-        self._rho = math.as_tensor(val)
+        self._rho = self._store('rho', val)
+        self._invalidate()
 
     @property
     def relative_humidity(self) -> Tensor1D_or_3D:
-        return vapor.relative_humidity(self._T, self._P, self._rho)
+        return vapor.relative_humidity(self.temperature, self.pressure, self.absolute_humidity)
 
     @relative_humidity.setter
     def relative_humidity(self, val: Tensor1D_or_3D):
         self.absolute_humidity = math.as_tensor(vapor.absolute_humidity(self._T, self._P, val))
 
+    @staticmethod
+    def _profile(a: Tensor1D_or_3D) -> Tensor1D_or_3D:
+        """
+        :return: высотный профиль, если 3D-поле a горизонтально однородно, иначе - само поле
+        """
+        if math.rank(a) < 3:
+            return a
+        columns = a.reshape(-1, a.shape[-1])
+        if np.array_equal(columns, np.broadcast_to(columns[:1], columns.shape)):
+            return columns[0].copy()
+        return a
+
+    def _store(self, name: str, a: Tensor1D_or_3D) -> Tensor1D_or_3D:
+        """
+        Сохранение поля T, P или rho: горизонтально однородное 3D-поле используется в расчетах как
+        1D-профиль, а исходное поле возвращается свойством (temperature, pressure, absolute_humidity)
+
+        :param name: 'T', 'P' или 'rho'
+        :return: поле для расчетов
+        """
+        a = math.as_tensor(a)
+        if math.rank(a) >= 3:
+            self._shape = a.shape[:-1]
+        profile = self._profile(a)
+        if profile is a:
+            self._fields.pop(name, None)
+        else:
+            self._fields[name] = a
+        return profile
+
+    def _planar(self, out):
+        """
+        Распространение результата расчета по 1D-профилям на 2D-сетку self._shape (см. planar)
+        """
+        if isinstance(out, tuple):
+            return tuple(self._planar(a) for a in out)
+        return np.broadcast_to(out, self._shape + np.shape(out)).copy()
+
     @property
-    def liquid_water(self) -> Tensor1D_or_3D:
+    def liquid_water(self) -> Union[Tensor1D_or_3D, SparseLiquidWater]:
         return self._w
 
     @liquid_water.setter
-    def liquid_water(self, val: Tensor1D_or_3D):
-        self._w = math.as_tensor(val)
+    def liquid_water(self, val: Union[Tensor1D_or_3D, SparseLiquidWater]):
+        if isinstance(val, SparseLiquidWater):
+            self._w = val
+        else:
+            self._w = math.as_tensor(val)
+        self._invalidate(liquid_only=True)
+
+    def _liquid_attenuation(self, frequency: Union[float, np.ndarray], T: Tensor1D_or_3D,
+                            w: Tensor1D_or_3D) -> Tensor1D_or_3D:
+        """
+        Погонный коэффициент поглощения в облаке (Дб/км) для полей (столбцов) T и w, см. attenuation.liquid_water
+        """
+        if self._use_tcl:
+            frequency, w = self._spectral(frequency, w)
+            return attenuation.liquid_water_eff(frequency, self._tcl, w)
+        return attenuation.liquid_water(*self._spectral(frequency, T, w))
 
     @property
     def altitudes(self) -> np.ndarray:
@@ -138,6 +292,7 @@ class Atmosphere:
         assert not np.isclose(val[0], 0.), 'zero altitude not allowed'
         self._dh = np.diff(np.insert(val, 0, 0.)).astype(cpu_float)  # self._dh - array
         self._alt = np.asarray(val, dtype=cpu_float)  # self._alt - array
+        self._invalidate()
 
     @property
     def dh(self) -> Union[float, np.ndarray]:
@@ -148,6 +303,7 @@ class Atmosphere:
         # assert self._T.shape == self._P.shape == self._rho.shape, 'dimensions must match'
         self._alt = np.cumsum([val for _ in range(self._T.shape[-1])], dtype=cpu_float)  # self._alt - array
         self._dh = np.cast[cpu_float](val)  # self._dh - 1 number
+        self._invalidate()
 
     @property
     def effective_cloud_temperature(self) -> float:
@@ -157,6 +313,25 @@ class Atmosphere:
     def effective_cloud_temperature(self, val: float):
         self._use_tcl = True
         self._tcl = val
+        self._invalidate(liquid_only=True)
+
+    @property
+    def approx(self) -> bool:
+        return self._approx
+
+    @approx.setter
+    def approx(self, val: bool):
+        self._approx = val
+        self._invalidate()
+
+    @property
+    def absorption_table(self) -> Union['AbsorptionTable', None]:
+        return self._table
+
+    @absorption_table.setter
+    def absorption_table(self, val: Union['AbsorptionTable', None]):
+        self._table = val
+        self._invalidate()
 
     @property
     def angle(self) -> float:
@@ -175,12 +350,398 @@ class Atmosphere:
         self._PX = val
 
     @property
+    def frequency_chunk(self) -> int:
+        """
+        :return: количество частот, обрабатываемых за один векторизованный проход
+        """
+        return max(1, self.chunk_size // max(np.size(self._T), np.size(self._w)))
+
+    def _invalidate(self, liquid_only: bool = False) -> None:
+        """
+        Сброс кэша при изменении полей или параметров расчета. Кэш не копируется, а создается заново,
+        так что копии атмосферы (copy.copy, _replace) сохраняют собственные данные.
+        Изменения массивов "на месте" (например, atm.temperature[0] = 15.) не отслеживаются
+        """
+        if not liquid_only:
+            self._gas_memo = OrderedDict()
+        self._liquid_memo = OrderedDict()
+        self._columns_memo = {}
+
+    def __getstate__(self) -> dict:
+        """
+        Кэши (см. _memoized, _columns, _shear_table) не сериализуются, например, при передаче
+        атмосферы в рабочие процессы (см. core.multi.parallel)
+        """
+        state = self.__dict__.copy()
+        state.update(_gas_memo=OrderedDict(), _liquid_memo=OrderedDict(), _columns_memo={}, _shear_tables={})
+        return state
+
+    def _memoized(self, frequency: Union[float, np.ndarray, None], name: tuple, compute: Callable,
+                  liquid: bool = False) -> Union[float, np.ndarray]:
+        """
+        Значение величины name для частоты (массива частот) frequency из кэша; при отсутствии - compute().
+        Кэш ограничен memo_size последними использованными частотами (LRU) и объемом memo_bytes:
+        при превышении объема вытесняются давно использованные частоты, а массив больше memo_bytes
+        не кэшируется (например, 3D-поля коэффициентов поглощения большой сетки). Кэшированные массивы
+        доступны только для чтения
+
+        :param name: имя величины вместе с параметрами, от которых она зависит (угол, метод интегрирования, ...)
+        :param liquid: величина зависит от водности (кэш сбрасывается также при изменении liquid_water)
+        """
+        if not self.memo_size:
+            return compute()
+        memo = self._liquid_memo if liquid else self._gas_memo
+        key = None if frequency is None else (np.shape(frequency), tuple(np.ravel(frequency).tolist()))
+        if key in memo:
+            memo.move_to_end(key)
+        else:
+            memo[key] = {}
+            while len(memo) > self.memo_size:
+                memo.popitem(last=False)
+        entry = memo[key]
+        if name not in entry:
+            value = compute()
+            if isinstance(value, np.ndarray):
+                if value.nbytes > self.memo_bytes:
+                    return value
+                value.flags.writeable = False
+            entry[name] = value
+            while len(memo) > 1 and \
+                    sum(getattr(v, 'nbytes', 0) for e in memo.values() for v in e.values()) > self.memo_bytes:
+                memo.popitem(last=False)
+        return entry[name]
+
+    def _spectral(self, frequency: Union[float, np.ndarray], *fields: Tensor1D_or_3D) -> tuple:
+        """
+        Согласование формы частот и полей: для массива частот - частоты [F, 1],
+        поля [..., 1, N], результат вычислений [..., F, N]
+        """
+        if math.rank(frequency) == 0:
+            return (frequency, ) + fields
+        return (math.as_tensor(frequency)[:, None], ) + tuple(a[..., None, :] for a in fields)
+
+    def _columns(self) -> Union[Tuple['Atmosphere', np.ndarray, tuple], None]:
+        """
+        Выделение уникальных вертикальных столбцов 3D-полей (T, P, rho, w)
+
+        :return: кортеж: 1 - атмосфера из уникальных столбцов (3D-поля формы [U, 1, N]),
+            2 - номера уникальных столбцов для каждого столбца исходной 2D-карты, 3 - форма 2D-карты.
+            None, если поля одномерны, theta != 0 или одинаковых столбцов мало.
+            При 1D-профилях T, P, rho все безоблачные столбцы совпадают, так что объем вычислений
+            определяется только облачной частью поля. Компактное представление водности
+            (SparseLiquidWater) в этом случае не разворачивается в 3D-массив.
+            Результат вычисляется один раз для текущих полей (кэш сбрасывается вместе с _invalidate)
+        """
+        if not self.unique_columns or not np.isclose(self._theta, 0.):
+            return None
+        if 'columns' not in self._columns_memo:
+            self._columns_memo['columns'] = self._unique_columns()
+        return self._columns_memo['columns']
+
+    def _unique_columns(self) -> Union[Tuple['Atmosphere', np.ndarray, tuple], None]:
+        """
+        Поиск уникальных столбцов (см. _columns)
+        """
+        gas = [self._T, self._P, self._rho]
+        w, label = self._w, None
+        if isinstance(self._w, SparseLiquidWater):
+            # столбцы нумеруются по уникальным профилям водности (0 - безоблачный столбец)
+            profiles = self._w.profiles()
+            index, inverse = self._unique_rows(profiles)
+            w = np.concatenate([np.zeros((1, profiles.shape[1]), dtype=cpu_float), profiles[index]])
+            label = self._w.scatter(inverse + 1).reshape(-1)
+            if max(math.rank(a) for a in gas) < 3:
+                # все безоблачные столбцы заменяются одним
+                return self._replace(*gas, w[:, None, :]), label, self._w.shape[:-1]
+
+        fields = gas if label is not None else gas + [w]
+        if max(math.rank(a) for a in fields) < 3:
+            return None
+        shape = next(a.shape[:-1] for a in fields if math.rank(a) >= 3)
+        key = [a.reshape(-1, a.shape[-1]) for a in fields if math.rank(a) >= 3]
+        if label is not None:
+            key.append(label[:, None].astype(cpu_float))
+        key = np.concatenate(key, axis=1)
+        index, inverse = self._unique_rows(key)
+        if 4 * len(index) > 3 * len(key):
+            return None
+        columns = [a.reshape(-1, a.shape[-1])[index][:, None, :] if math.rank(a) >= 3 else a for a in fields]
+        if label is not None:
+            columns.append(w[label[index]][:, None, :])
+        return self._replace(*columns), inverse, shape
+
+    @staticmethod
+    def _unique_rows(key: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        :return: номера первых вхождений уникальных строк 2D-массива key и номер уникальной строки для каждой строки
+        """
+        # группировка по проекции на случайный вектор с последующей проверкой точного совпадения строк
+        projection = key @ np.random.RandomState(0).uniform(0.5, 1.5, key.shape[1])
+        _, index, inverse = np.unique(projection, return_index=True, return_inverse=True)
+        if not np.array_equal(key[index][inverse], key):
+            _, index, inverse = np.unique(key, axis=0, return_index=True, return_inverse=True)
+        return index, inverse.reshape(-1)
+
+    def _replace(self, T: Tensor1D_or_3D, P: Tensor1D_or_3D, rho: Tensor1D_or_3D,
+                 w: Tensor1D_or_3D) -> 'Atmosphere':
+        """
+        :return: копия атмосферы с заменой полей T, P, rho и w (остальные параметры сохраняются)
+        """
+        atm = copy.copy(self)
+        if not (T is self._T and P is self._P and rho is self._rho):
+            atm._gas_memo = OrderedDict()
+        atm._liquid_memo = OrderedDict()
+        atm._columns_memo = {}
+        atm._T, atm._P, atm._rho, atm._w = T, P, rho, w
+        atm._shape, atm._fields = None, {}
+        atm.attenuation = Atmosphere.attenuation(atm)
+        atm.opacity = Atmosphere.opacity(atm)
+        atm.downward = Atmosphere.downward(atm)
+        atm.upward = Atmosphere.upward(atm)
+        return atm
+
+    @property
+    @planar('_rho')
     def Q(self):
-        return integrate.full(self._rho, self._dh, self.integration_method) / 10.
+        return self._memoized(None, ('Q', self.integration_method),
+                              lambda: integrate.full(self._rho, self._dh, self.integration_method) / 10.)
 
     @property
     def W(self):
-        return integrate.full(self._w, self._dh, self.integration_method)
+        def compute():
+            if isinstance(self._w, SparseLiquidWater):
+                return self._w.scatter(integrate.full(self._w.profiles(), self._dh, self.integration_method))
+            return integrate.full(self._w, self._dh, self.integration_method)
+        return self._memoized(None, ('W', self.integration_method), compute, liquid=True)
+
+    @profiled('Atmosphere.absorption', 1)
+    def _absorption(self, frequency: Union[float, np.ndarray], sec: float = 1.) -> Tensor1D_or_3D:
+        """
+        Суммарный погонный коэффициент поглощения, Нп/км. Поглощение в газах масштабируется
+        до сложения с поглощением в облаках: при 1D-профилях T, P, rho и 3D-поле водности
+        3D-массив создается только один раз - для облачной составляющей
+
+        :param frequency: частота излучения в ГГц (число или 1D-массив частот)
+        :param sec: множитель (секанс угла наблюдения)
+        """
+        gas = sec * dB2np * (self.attenuation.oxygen(frequency) + self.attenuation.water_vapor(frequency))
+        g = self.attenuation.liquid_water(frequency)
+        if np.shape(g) != np.broadcast_shapes(np.shape(g), np.shape(gas)):
+            return gas + sec * dB2np * g
+        g *= sec * dB2np
+        g += gas
+        return g
+
+    def _shear_table(self, shape: Tuple[int, ...], theta: float) -> Union[Tuple[np.ndarray, int], None]:
+        """
+        Таблица перехода к наклонной сетке для 3D-полей (см. integrate.shear_table). Рассчитывается
+        один раз для каждого набора (угол, горизонтальная протяженность, наклон, форма поля, шаг по высоте)
+
+        :return: таблица перехода или None, если переход не требуется (1D-профиль или theta = 0)
+        """
+        if len(shape) < 3 or np.isclose(theta, 0.):
+            return None
+        key = (float(theta), float(self._PX), self.incline, shape[0], shape[-1], np.asarray(self._dh).tobytes())
+        if key not in self._shear_tables:
+            self._shear_tables[key] = integrate.shear_table(shape, self._dh, theta, self._PX, self.incline)
+        return self._shear_tables[key]
+
+    def _geometry(self, theta: float) -> tuple:
+        """
+        :return: параметры, от которых зависит интегрирование вдоль траектории наблюдения (ключ кэша)
+        """
+        return float(theta), float(self._PX), self.incline, self.integration_method
+
+    def _full(self, a: Tensor1D_or_3D, theta: float) -> Union[float, Tensor2D]:
+        """
+        Интегрирование по высоте вдоль траектории наблюдения
+        """
+        return integrate.full(a, self._dh, self.integration_method, theta, self._PX, self.incline,
+                              self._shear_table(np.shape(a), theta))
+
+    @profiled('Atmosphere.slant')
+    def _slant(self, T: Tensor1D_or_3D, g: Tensor1D_or_3D,
+               theta: float) -> Tuple[Tensor1D_or_3D, Tensor1D_or_3D]:
+        """
+        Температура и поглощение вдоль траектории наблюдения (для 3D-полей при theta != 0 - на наклонной сетке)
+        """
+        if math.rank(g) >= 3 and not np.isclose(theta, 0.):
+            table = self._shear_table(g.shape, theta)
+            g, _ = integrate.shear(g, self._dh, theta, self._PX, self.incline, table)
+            if math.rank(T) >= 3:
+                T, _ = integrate.shear(T, self._dh, theta, self._PX, self.incline, table)
+        return T, g
+
+    def _opacities(self, g: Tensor1D_or_3D, theta: float, direction: str) -> Tensor1D_or_3D:
+        """
+        Поглощение от поверхности до каждого уровня (direction='up') или от каждого уровня
+        до верхней границы (direction='down'), Нп. g - на сетке вдоль траектории наблюдения
+        """
+        tau = integrate.cumulative(g, self._dh, self.integration_method, direction)
+        if math.rank(g) <= 2 and not np.isclose(theta, 0.):
+            tau = tau / math.cos(theta)
+        return tau
+
+    def _transfer(self, T: Tensor1D_or_3D, g: Tensor1D_or_3D, theta: float,
+                  direction: str) -> Union[float, Tensor2D]:
+        """
+        Решение уравнения переноса за один проход по высоте (накопленные суммы вместо
+        повторного интегрирования поглощения для каждого уровня)
+
+        :param T: термодинамическая температура, К
+        :param g: погонный коэффициент поглощения, Нп/км
+        :param theta: зенитный угол наблюдения, рад.
+        :param direction: 'up' - поглощение от поверхности до уровня (нисходящее излучение);
+            'down' - от уровня до верхней границы (восходящее излучение)
+        """
+        T, g = self._slant(T, g, theta)
+        tau = self._opacities(g, theta, direction)
+        return integrate.full(T * g * math.exp(-1 * tau), self._dh, self.integration_method)
+
+    def _angular(self, frequency: Union[float, np.ndarray], T: Tensor1D_or_3D, g: Tensor1D_or_3D,
+                 angles: Union[float, np.ndarray],
+                 direction: str) -> Tuple[Union[float, Tensor2D], Union[float, Tensor2D]]:
+        """
+        Решение уравнения переноса сразу для набора зенитных углов (каждый столбец - плоскослоистая
+        атмосфера). Погонные коэффициенты и накопленные поглощения рассчитываются один раз,
+        для каждого угла они только умножаются на секанс
+
+        :param T: термодинамическая температура, К (форма [..., (1,) N], см. _spectral)
+        :param g: погонный коэффициент поглощения в надир, Нп/км (форма [..., (F,) N])
+        :param angles: зенитные углы, рад. (число или 1D-массив)
+        :param direction: 'up' - нисходящее излучение; 'down' - восходящее излучение
+        :return: полное поглощение (Нп) и яркостная температура, массивы формы [..., A, (F)]
+        """
+        k = 2 + (math.rank(frequency) > 0)     # положение угловой оси относительно конца
+        sec = 1. / np.cos(np.atleast_1d(np.asarray(angles, dtype=float)))
+        sec = math.as_tensor(sec.reshape((-1,) + (1,) * (k - 1)))
+        tau = np.expand_dims(integrate.cumulative(g, self._dh, self.integration_method, direction), -k)
+        Tg = np.expand_dims(T * g, -k)
+        tb = integrate.full(sec * Tg * math.exp(-sec * tau), self._dh, self.integration_method)
+        return sec[..., 0] * tau[..., -1 if direction == 'up' else 0], tb
+
+    @profiled('Atmosphere.radiation', 1)
+    @planar()
+    @columnar
+    @spectral
+    def radiation(self, frequency: Union[float, np.ndarray],
+                  __theta: float = None,
+                  angles: Union[float, np.ndarray] = None) -> Tuple[Union[float, Tensor2D], Union[float, Tensor2D],
+                                                                    Union[float, Tensor2D]]:
+        """
+        Совместный расчет полного поглощения и яркостных температур нисходящего и восходящего излучения.
+        Погонные коэффициенты поглощения вычисляются один раз, уравнение переноса решается
+        накопленными суммами (см. Atmosphere.solver = 'cumulative')
+
+        :param frequency: частота излучения в ГГц (число или 1D-массив частот)
+        :param __theta: угол наблюдения в радианах (deprecated)
+        :param angles: зенитные углы, рад. (число или 1D-массив). Если указаны, расчет выполняется сразу для всех
+            углов в приближении плоскослоистой атмосферы для каждого столбца (self.angle не учитывается),
+            результаты имеют угловую ось перед частотной: [..., A, (F)]
+        :return: кортеж значений: 1 - полное поглощение (Нп), 2 - яркостная температура нисходящего
+            излучения без учета реликтового фона, 3 - яркостная температура восходящего излучения
+        """
+        if angles is not None:
+            g = self._absorption(frequency)
+            _, T = self._spectral(frequency, self._T + 273.15)
+            tau, tb_down = self._angular(frequency, T, g, angles, 'up')
+            _, tb_up = self._angular(frequency, T, g, angles, 'down')
+            return tau, tb_down, tb_up
+
+        if __theta is None:
+            _theta = self._theta
+            sec = 1.
+        else:
+            _theta = 0.
+            sec = 1. / np.cos(__theta)
+
+        g = self._absorption(frequency, sec)
+        _, T = self._spectral(frequency, self._T + 273.15)
+        T, g = self._slant(T, g, _theta)
+        tau_up = self._opacities(g, _theta, 'up')
+        tb_down = integrate.full(T * g * math.exp(-1 * tau_up), self._dh, self.integration_method)
+        tb_up = integrate.full(T * g * math.exp(-1 * self._opacities(g, _theta, 'down')),
+                               self._dh, self.integration_method)
+        return tau_up[..., -1], tb_down, tb_up
+
+    @profiled('Atmosphere.jacobian', 1)
+    @planar()
+    def jacobian(self, frequency: Union[float, np.ndarray], cotangents: Callable,
+                 __theta: float = None) -> Tuple[Tuple[Union[float, Tensor2D], ...], Tuple[Tensor1D_or_3D, ...]]:
+        """
+        Производные величины L, зависящей от полного поглощения и яркостных температур нисходящего
+        и восходящего излучения, по значениям T, rho и w в каждом узле высотной сетки.
+        Прямой проход совпадает с radiation, обратный проход использует накопленные поглощения
+        (см. integrate.cumulative_adjoint), так что расчет требует O(N) операций на столбец.
+        Производные погонных коэффициентов поглощения по T и rho находятся численно в каждом узле
+
+        :param frequency: частота излучения в ГГц (число или 1D-массив частот)
+        :param cotangents: функция (tau, tb_down, tb_up) -> (dL/dtau, dL/dtb_down, dL/dtb_up), где tau, tb_down,
+            tb_up - результаты прямого прохода (см. radiation). Например, для L = tb_up: lambda *_: (0., 0., 1.)
+        :param __theta: угол наблюдения в радианах (deprecated)
+        :return: кортеж (tau, tb_down, tb_up) и кортеж производных (dL/dT, dL/drho, dL/dw) формы [..., (F,) N].
+            Для 3D-полей - только при theta = 0
+        """
+        if __theta is None:
+            _theta = self._theta
+            sec = 1.
+        else:
+            _theta = 0.
+            sec = 1. / np.cos(__theta)
+        fields = [self._T, self._P, self._rho, self._w]
+        if max(math.rank(a) for a in fields) >= 3 and not np.isclose(_theta, 0.):
+            raise RuntimeError('для 3D-полей якобиан рассчитывается только в зените (theta = 0)')
+
+        w, index = self._w, None
+        if isinstance(self._w, SparseLiquidWater):
+            # при 1D-профилях T, P, rho прямой проход выполняется для облачных столбцов и одного безоблачного
+            # (с номером 0), а результаты распределяются по 2D-карте (index); при 3D-полях - для всех столбцов
+            w = np.concatenate([np.zeros((1, self._w.shape[-1]), dtype=cpu_float), self._w.profiles()])
+            index = self._w.scatter(np.arange(1, len(w)))
+            if max(math.rank(a) for a in fields[:3]) >= 3:
+                w, index = w[index], None
+
+        def expand(a):
+            return a if index is None else np.asarray(a)[index]
+
+        s = 1. / math.cos(_theta)
+        frequency, T, P, rho, w = self._spectral(frequency, self._T, self._P, self._rho, w)
+        T, rho = np.asarray(T, dtype=float), np.asarray(rho, dtype=float)
+
+        def gas(t, r):
+            return sec * dB2np * (attenuation.oxygen(frequency, t, P, r, self.approx, self.absorption_table) +
+                                  attenuation.water_vapor(frequency, t, P, r, self.approx, self.absorption_table))
+
+        def liquid(t, a):
+            if self._use_tcl:
+                return sec * dB2np * attenuation.liquid_water_eff(frequency, self._tcl, a)
+            return sec * dB2np * attenuation.liquid_water(frequency, t, a)
+
+        dt, dr = 1e-2, 1e-3
+        g = math.as_tensor(gas(T, rho) + liquid(T, w))
+        g_T = (gas(T + dt, rho) + liquid(T + dt, w) - gas(T - dt, rho) - liquid(T - dt, w)) / (2 * dt)
+        g_rho = (gas(T, rho + dr) - gas(T, rho)) / dr
+        g_w = liquid(T, np.ones_like(w))
+
+        T = math.as_tensor(T + 273.15)
+        q = integrate.weights(math.len_(g), self._dh, self.integration_method)
+        tau_up = self._opacities(g, _theta, 'up')
+        tau_down = self._opacities(g, _theta, 'down')
+        x_up, x_down = math.exp(-1 * tau_up), math.exp(-1 * tau_down)
+        tau = expand(tau_up[..., -1])
+        tb_down = expand(math.sum_(q * T * g * x_up, axis=-1))
+        tb_up = expand(math.sum_(q * T * g * x_down, axis=-1))
+
+        c_tau, c_down, c_up = [np.asarray(c)[..., None] for c in cotangents(tau, tb_down, tb_up)]
+        # производные по погонному коэффициенту поглощения в каждом узле: излучение самого узла
+        # и ослабление излучения остальных узлов (обратный проход по накопленным поглощениям)
+        dg = c_tau * s * q + \
+            c_down * expand(q * T * x_up - s * integrate.cumulative_adjoint(
+                q * T * g * x_up, self._dh, self.integration_method, 'up')) + \
+            c_up * expand(q * T * x_down - s * integrate.cumulative_adjoint(
+                q * T * g * x_down, self._dh, self.integration_method, 'down'))
+        dT = q * (c_down * expand(g * x_up) + c_up * expand(g * x_down)) + dg * expand(g_T)
+        return (tau, tb_down, tb_up), (dT, dg * g_rho, dg * expand(g_w))
 
     @classmethod
     def Standard(cls, T0: Union[float, Tensor1D_or_2D] = 15., P0: Union[float, Tensor1D_or_2D] = 1013,
@@ -242,6 +803,7 @@ class Atmosphere:
         def __init__(self, atmosphere: 'Atmosphere'):
             self.outer = atmosphere
 
+        @planar('_T', '_P', '_rho')
         @atmospheric
         def oxygen(self: 'Atmosphere', frequency: float) -> Union[float, Tensor1D_or_3D]:
             """
@@ -250,8 +812,10 @@ class Atmosphere:
             :param frequency: частота излучения в ГГц
             :return: погонный коэффициент поглощения в кислороде (Дб/км)
             """
-            return attenuation.oxygen(frequency, self._T, self._P, self._rho, self.approx)
+            return self._memoized(frequency, ('attenuation.oxygen',), lambda: attenuation.oxygen(
+                *self._spectral(frequency, self._T, self._P, self._rho), self.approx, self.absorption_table))
 
+        @planar('_T', '_P', '_rho')
         @atmospheric
         def water_vapor(self: 'Atmosphere', frequency: float) -> Union[float, Tensor1D_or_3D]:
             """
@@ -260,8 +824,10 @@ class Atmosphere:
             :param frequency: частота излучения в ГГц
             :return: погонный коэффициент поглощения в водяном паре (Дб/км)
             """
-            return attenuation.water_vapor(frequency, self._T, self._P, self._rho, self.approx)
+            return self._memoized(frequency, ('attenuation.water_vapor',), lambda: attenuation.water_vapor(
+                *self._spectral(frequency, self._T, self._P, self._rho), self.approx, self.absorption_table))
 
+        @planar('_T', '_w')
         @atmospheric
         def liquid_water(self: 'Atmosphere', frequency: float) -> Union[float, Tensor1D_or_3D]:
             """
@@ -270,10 +836,13 @@ class Atmosphere:
             :param frequency: частота излучения в ГГц
             :return: погонный коэффициент поглощения в облаке (Дб/км)
             """
-            if self._use_tcl:
-                return attenuation.liquid_water_eff(frequency, self._tcl, self._w)
-            return attenuation.liquid_water(frequency, self._T, self._w)
+            if not isinstance(self._w, SparseLiquidWater):
+                return self._liquid_attenuation(frequency, self._T, self._w)
+            # расчет только для облачных столбцов (в безоблачных поглощение равно нулю)
+            T = self._T if math.rank(self._T) < 3 else self._T.reshape(-1, self._T.shape[-1])[self._w.columns]
+            return self._w.scatter(self._liquid_attenuation(frequency, T, self._w.profiles()))
 
+        @planar()
         @atmospheric
         def summary(self: 'Atmosphere', frequency: float) -> Union[float, Tensor1D_or_3D]:
             """
@@ -291,37 +860,50 @@ class Atmosphere:
         def __init__(self, atmosphere: 'Atmosphere'):
             self.outer = atmosphere
 
+        @profiled('opacity.oxygen', 1)
+        @planar('_T', '_P', '_rho')
         @atmospheric
+        @spectral
         def oxygen(self: 'Atmosphere', frequency: float) -> Union[float, Tensor2D]:
             """
             :return: полное поглощение в кислороде (путем интегрирования погонного коэффициента). В неперах
             """
-            return dB2np * integrate.full(self.attenuation.oxygen(frequency),
-                                          self._dh, self.integration_method,
-                                          self._theta, self._PX, self.incline)
+            return self._memoized(frequency, ('opacity.oxygen',) + self._geometry(self._theta),
+                                  lambda: dB2np * self._full(self.attenuation.oxygen(frequency), self._theta))
 
+        @profiled('opacity.water_vapor', 1)
+        @planar('_T', '_P', '_rho')
         @atmospheric
+        @spectral
         def water_vapor(self: 'Atmosphere', frequency: float) -> Union[float, Tensor2D]:
             """
             :return: полное поглощение в водяном паре (путем интегрирования погонного коэффициента). В неперах
             """
-            return dB2np * integrate.full(self.attenuation.water_vapor(frequency),
-                                          self._dh, self.integration_method,
-                                          self._theta, self._PX, self.incline)
+            return self._memoized(frequency, ('opacity.water_vapor',) + self._geometry(self._theta),
+                                  lambda: dB2np * self._full(self.attenuation.water_vapor(frequency), self._theta))
 
+        @profiled('opacity.liquid_water', 1)
+        @planar()
         @atmospheric
+        @spectral
         def liquid_water(self: 'Atmosphere', frequency: float) -> Union[float, Tensor2D]:
             """
             :return: полное поглощение в облаке (путем интегрирования погонного коэффициента). В неперах
             """
-            return dB2np * integrate.full(self.attenuation.liquid_water(frequency),
-                                          self._dh, self.integration_method,
-                                          self._theta, self._PX, self.incline)
+            return self._memoized(frequency, ('opacity.liquid_water',) + self._geometry(self._theta),
+                                  lambda: dB2np * self._full(self.attenuation.liquid_water(frequency), self._theta), liquid=True)
 
+        @profiled('opacity.summary', 1)
+        @planar()
         @atmospheric
-        def summary(self: 'Atmosphere', frequency: float, __theta: float = None) -> Union[float, Tensor2D]:
+        @columnar
+        @spectral
+        def summary(self: 'Atmosphere', frequency: Union[float, np.ndarray],
+                    __theta: float = None) -> Union[float, Tensor2D]:
             """
-            :return: полное поглощение в атмосфере (путем интегрирования). В неперах
+            :param frequency: частота излучения в ГГц (число или 1D-массив частот)
+            :return: полное поглощение в атмосфере (путем интегрирования). В неперах.
+                Для массива частот - с последней частотной осью
             """
             if __theta is None:
                 _theta = self._theta
@@ -330,9 +912,9 @@ class Atmosphere:
                 _theta = 0.
                 sec = 1. / np.cos(__theta)
 
-            return sec * dB2np * integrate.full(self.attenuation.summary(frequency),
-                                          self._dh, self.integration_method,
-                                          _theta, self._PX, self.incline)
+            return self._memoized(frequency, ('opacity.summary', sec) + self._geometry(_theta),
+                                  lambda: sec * dB2np * self._full(self.attenuation.summary(frequency), _theta),
+                                  liquid=True)
 
     # noinspection PyTypeChecker
     class downward:
@@ -342,16 +924,28 @@ class Atmosphere:
         def __init__(self, atmosphere: 'Atmosphere'):
             self.outer = atmosphere
 
+        @profiled('downward.brightness_temperature', 1)
+        @planar()
         @atmospheric
-        def brightness_temperature(self: 'Atmosphere', frequency: float, __theta: float = None,
-                                   background=True) -> Union[float, Tensor2D]:
+        @spectral
+        def brightness_temperature(self: 'Atmosphere', frequency: Union[float, np.ndarray],
+                                   __theta: float = None, background=True,
+                                   angles: Union[float, np.ndarray] = None) -> Union[float, Tensor2D]:
             """
             Яркостная температура нисходящего излучения
 
-            :param frequency: частота излучения в ГГц
+            :param frequency: частота излучения в ГГц (число или 1D-массив частот;
+                для массива результат имеет последнюю частотную ось)
             :param __theta: угол наблюдения в радианах (deprecated)
             :param background: учитывать космический фон - реликтовое излучение (да/нет)
+            :param angles: зенитные углы, рад. (число или 1D-массив) - расчет сразу для всех углов,
+                результат имеет угловую ось перед частотной (см. Atmosphere.radiation)
             """
+            if angles is not None:
+                _, T = self._spectral(frequency, self._T + 273.15)
+                tau, brt = self._angular(frequency, T, self._absorption(frequency), angles, 'up')
+                return brt + self.T_cosmic * math.exp(-1 * tau) if background else brt
+
             if __theta is None:
                 _theta = self._theta
                 sec = 1.
@@ -359,20 +953,23 @@ class Atmosphere:
                 _theta = 0.
                 sec = 1. / np.cos(__theta)
 
-            g = sec * dB2np * self.attenuation.summary(frequency)
-            T = self._T + 273.15
+            g = self._absorption(frequency, sec)
+            _, T = self._spectral(frequency, self._T + 273.15)
 
-            def f(h):
-                integral, b = integrate.limits(g, 0, h, self._dh, self.integration_method,
-                                               _theta, self._PX, self.incline,
-                                               boundaries=True)
-                return cx(at(T, h), b, h) * cx(at(g, h), b, h) * math.exp(-1 * integral)
-            # f = lambda h: at(T, h) * at(g, h) * \
-            #     math.exp(-1 * integrate.limits(g, 0, h, self._dh, self.integration_method))
+            if self.solver == 'cumulative':
+                brt = self._transfer(T, g, _theta, 'up')
+            else:
+                T, g = self._slant(T, g, _theta)
+                theta = 0. if math.rank(g) >= 3 else _theta   # 3D-поля уже на наклонной сетке
 
-            inf = math.len_(g) - 1
-            brt, boundaries = integrate.callable_f(f, 0, inf, self._dh, self.integration_method,
-                                                   boundaries=True)
+                def f(h):
+                    integral = integrate.limits(g, 0, h, self._dh, self.integration_method, theta)
+                    return at(T, h) * at(g, h) * math.exp(-1 * integral)
+                # f = lambda h: at(T, h) * at(g, h) * \
+                #     math.exp(-1 * integrate.limits(g, 0, h, self._dh, self.integration_method))
+
+                inf = math.len_(g) - 1
+                brt = integrate.callable_f(f, 0, inf, self._dh, self.integration_method)
             add = 0.
             if background:
                 add = self.T_cosmic * math.exp(-1 * self.opacity.summary(frequency, __theta))
@@ -382,18 +979,20 @@ class Atmosphere:
         def brightness_temperatures(self: 'Atmosphere', frequencies: Union[np.ndarray, List[float]],
                                     __theta: float = None,
                                     background=True,
-                                    n_workers: int = 8) -> np.ndarray:
+                                    n_workers: int = 8,
+                                    backend: str = 'process') -> np.ndarray:
             """
             Яркостная температура нисходящего излучения
 
             :param frequencies: список частот в ГГц
             :param __theta: угол наблюдения в радианах (deprecated)
             :param background: учитывать космический фон - реликтовое излучение (да/нет)
-            :param n_workers: количество потоков для распараллеливания
+            :param n_workers: количество процессов (потоков) для распараллеливания
+            :param backend: 'process' - пул процессов, 'thread' - пул потоков
             """
             return parallel(frequencies, func=self.downward.brightness_temperature,
                             args=(__theta, background, ),
-                            n_workers=n_workers)
+                            n_workers=n_workers, backend=backend)
 
     # noinspection PyTypeChecker
     class upward:
@@ -403,15 +1002,26 @@ class Atmosphere:
         def __init__(self, atmosphere: 'Atmosphere'):
             self.outer = atmosphere
 
+        @profiled('upward.brightness_temperature', 1)
+        @planar()
         @atmospheric
-        def brightness_temperature(self: 'Atmosphere', frequency: float,
-                                   __theta: float = None) -> Union[float, Tensor2D]:
+        @spectral
+        def brightness_temperature(self: 'Atmosphere', frequency: Union[float, np.ndarray],
+                                   __theta: float = None,
+                                   angles: Union[float, np.ndarray] = None) -> Union[float, Tensor2D]:
             """
             Яркостная температура восходящего излучения (без учета подстилающей поверхности)
 
-            :param frequency: частота излучения в ГГц
+            :param frequency: частота излучения в ГГц (число или 1D-массив частот;
+                для массива результат имеет последнюю частотную ось)
             :param __theta: угол наблюдения в радианах (deprecated)
+            :param angles: зенитные углы, рад. (число или 1D-массив) - расчет сразу для всех углов,
+                результат имеет угловую ось перед частотной (см. Atmosphere.radiation)
             """
+            if angles is not None:
+                _, T = self._spectral(frequency, self._T + 273.15)
+                return self._angular(frequency, T, self._absorption(frequency), angles, 'down')[1]
+
             if __theta is None:
                 _theta = self._theta
                 sec = 1.
@@ -419,15 +1029,19 @@ class Atmosphere:
                 _theta = 0.
                 sec = 1. / np.cos(__theta)
 
-            g = sec * dB2np * self.attenuation.summary(frequency)
+            g = self._absorption(frequency, sec)
             inf = math.len_(g) - 1
-            T = self._T + 273.15
+            _, T = self._spectral(frequency, self._T + 273.15)
+
+            if self.solver == 'cumulative':
+                return self._transfer(T, g, _theta, 'down')
+
+            T, g = self._slant(T, g, _theta)
+            theta = 0. if math.rank(g) >= 3 else _theta   # 3D-поля уже на наклонной сетке
 
             def f(h):
-                integral, b = integrate.limits(g, h, inf, self._dh, self.integration_method,
-                                               _theta, self._PX, self.incline,
-                                               boundaries=True)
-                return cx(at(T, h), b, h) * cx(at(g, h), b, h) * math.exp(-1 * integral)
+                integral = integrate.limits(g, h, inf, self._dh, self.integration_method, theta)
+                return at(T, h) * at(g, h) * math.exp(-1 * integral)
             # f = lambda h: at(T, h) * at(g, h) * \
             #     math.exp(-1 * integrate.limits(g, h, inf, self._dh, self.integration_method))
 
@@ -436,17 +1050,19 @@ class Atmosphere:
         @atmospheric
         def brightness_temperatures(self: 'Atmosphere', frequencies: Union[np.ndarray, List[float]],
                                     __theta: float = None,
-                                    n_workers: int = 8) -> np.ndarray:
+                                    n_workers: int = 8,
+                                    backend: str = 'process') -> np.ndarray:
             """
             Яркостная температура восходящего излучения (без учета подстилающей поверхности)
 
             :param frequencies: список частот в ГГц
             :param __theta: угол наблюдения в радианах (deprecated)
-            :param n_workers: количество потоков для распараллеливания
+            :param n_workers: количество процессов (потоков) для распараллеливания
+            :param backend: 'process' - пул процессов, 'thread' - пул потоков
             """
             return parallel(frequencies, func=self.upward.brightness_temperature,
                             args=(__theta, ),
-                            n_workers=n_workers)
+                            n_workers=n_workers, backend=backend)
 
 
 class avg:
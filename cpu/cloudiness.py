@@ -7,12 +7,67 @@ from scipy.special import gamma
 import time
 
 
+class SparseLiquidWater:
+    def __init__(self, shape: Tuple[int, int, int], columns: np.ndarray, bottom: int, values: np.ndarray):
+        """
+        Компактное представление 3D-поля водности: хранятся только облачные столбцы
+        и только уровни от нижней границы облаков до вершины самого мощного облака
+
+        :param shape: форма соответствующего 3D-поля
+        :param columns: номера облачных столбцов (в 2D-карте, развернутой в 1D)
+        :param bottom: номер нижнего хранимого уровня
+        :param values: водность в облачных столбцах на хранимых уровнях, кг/м^3 (2D-массив [столбцы, уровни])
+        """
+        self.shape = tuple(shape)
+        self.columns = np.asarray(columns)
+        self.bottom = bottom
+        self.values = np.asarray(values, dtype=np.float32)
+
+    @property
+    def ndim(self) -> int:
+        return len(self.shape)
+
+    @property
+    def size(self) -> int:
+        return int(np.prod(self.shape))
+
+    def profiles(self) -> np.ndarray:
+        """
+        :return: полные высотные профили водности облачных столбцов (2D-массив [столбцы, уровни])
+        """
+        out = np.zeros((len(self.columns), self.shape[-1]), dtype=np.float32)
+        out[:, self.bottom:self.bottom + self.values.shape[1]] = self.values
+        return out
+
+    def scatter(self, a: np.ndarray, fill: float = 0.) -> np.ndarray:
+        """
+        Распределить значения, рассчитанные для облачных столбцов, по 2D-карте
+
+        :param a: значения для облачных столбцов (первая ось - столбцы)
+        :param fill: значение в безоблачных столбцах
+        :return: 2D-карта (с дополнительными осями a, если есть)
+        """
+        a = np.asarray(a)
+        out = np.full((int(np.prod(self.shape[:-1])), ) + a.shape[1:], fill, dtype=a.dtype)
+        out[self.columns] = a
+        return out.reshape(self.shape[:-1] + a.shape[1:])
+
+    def dense(self) -> np.ndarray:
+        """
+        :return: поле водности в 3D, кг/м^3
+        """
+        w = np.zeros(self.shape, dtype=np.float32)
+        w.reshape(-1, self.shape[-1])[self.columns, self.bottom:self.bottom + self.values.shape[1]] = self.values
+        return w
+
+
 def liquid_water(domain: Union[Domain3D, Column3D],
                  height_map2d: np.ndarray,
                  clouds_bottom: float = 1.5,
                  const_w: bool = False,
                  mu0: float = 3.27, psi0: float = 0.67,
-                 _w: Callable = lambda _h: 0.132574 * np.power(_h, 2.30215)) -> np.ndarray:
+                 _w: Callable = lambda _h: 0.132574 * np.power(_h, 2.30215),
+                 sparse: bool = False) -> Union[np.ndarray, SparseLiquidWater]:
     """
     Расчет 3D поля водности по заданному 2D-распределению мощности облаков
 
@@ -23,29 +78,36 @@ def liquid_water(domain: Union[Domain3D, Column3D],
     :param mu0: безразмерный параметр
     :param psi0: безразмерный параметр
     :param _w: зависимость водозапаса от мощности облака
+    :param sparse: вернуть компактное представление (SparseLiquidWater) вместо 3D-массива
     :return: поле водности в 3D
     """
     min_level = domain.k(clouds_bottom)
     max_level = domain.k(clouds_bottom + np.max(height_map2d))
     # w_map2d = 0.132574 * np.power(height_map2d, 2.30215)
     w_map2d = _w(height_map2d)
-    w = np.zeros(domain.nodes, dtype=float)
     cond = np.logical_not(np.isclose(height_map2d, 0.))
+    # водность в облачных столбцах на уровнях min_level..max_level-1
+    w = np.zeros((np.count_nonzero(cond), max(max_level - min_level, 0)), dtype=float)
 
     if const_w:
         for k in range(min_level, max_level):
             xi = (domain.z(k) - clouds_bottom) / height_map2d[cond]
             xi[(xi < 0) | (xi > 1)] = 0.
             xi[(0 <= xi) | (xi <= 1)] = 1.
-            w[cond, k] = xi * w_map2d[cond] / height_map2d[cond]
+            w[:, k - min_level] = xi * w_map2d[cond] / height_map2d[cond]
     else:
         for k in range(min_level, max_level):
             xi = (domain.z(k) - clouds_bottom) / height_map2d[cond]
             xi[(xi < 0) | (xi > 1)] = 0.
-            w[cond, k] = \
+            w[:, k - min_level] = \
                 np.power(xi, mu0) * np.power(1 - xi, psi0) * w_map2d[cond] / height_map2d[cond] * \
                 gamma(2 + mu0 + psi0) / (gamma(1 + mu0) * gamma(1 + psi0))
-    return w  # 3D array
+
+    if sparse:
+        return SparseLiquidWater(domain.nodes, np.flatnonzero(cond), min_level, w)
+    dense = np.zeros(domain.nodes, dtype=float)
+    dense[cond, min_level:max_level] = w
+    return dense  # 3D array
 
 
 class Cloudiness3D(Domain3D):
@@ -60,8 +122,9 @@ class Cloudiness3D(Domain3D):
 
     def liquid_water(self, height_map2d: np.ndarray, const_w: bool = False,
                      mu0: float = 3.27, psi0: float = 0.67,
-                     _w: Callable = lambda _h: 0.132574 * np.power(_h, 2.30215)) -> np.ndarray:
-        return liquid_water(self, height_map2d, self.clouds_bottom, const_w, mu0, psi0, _w)  # 3D array
+                     _w: Callable = lambda _h: 0.132574 * np.power(_h, 2.30215),
+                     sparse: bool = False) -> Union[np.ndarray, SparseLiquidWater]:
+        return liquid_water(self, height_map2d, self.clouds_bottom, const_w, mu0, psi0, _w, sparse)  # 3D array
 
 
 class CloudinessColumn(Column3D):
@@ -91,7 +154,7 @@ class Plank3D(Domain3D):
 
     def generate_clouds(self, Dm: float = 3., dm: float = 0., K: float = 100,
                         alpha: float = 1., beta: float = 0.5, eta: float = 1., seed: int = 42,
-                        timeout: float = 30., verbose=True) -> list:
+                        timeout: float = 30., verbose=True, free_space: bool = False) -> list:
         """
         :param Dm: максимальный диаметр облака, км
         :param dm: минимально возможный диаметр облака в км
@@ -102,6 +165,9 @@ class Plank3D(Domain3D):
         :param seed: состояние генератора случайных чисел (определяет положения облаков в 3D)
         :param timeout: максимальное время ожидания
         :param verbose: вывод доп. информации
+        :param free_space: выбирать положения облаков только среди свободных ячеек сетки Oxy
+            (для распределений с большим процентом покрытия неба). Если False - равномерно по всей
+            области, как раньше (при одном и том же seed результат не меняется)
         :return: список облаков
         """
         np.random.seed(seed)
@@ -138,6 +204,7 @@ class Plank3D(Domain3D):
         #                 raise TimeoutError('timeout exceeded')
 
         # вариант 4
+        grid = CloudGrid(max(Dm, self.dx, self.dy))   # пересечения проверяются только с соседними облаками
         r = np.sqrt(self.i(Dm) * self.i(Dm) + self.j(Dm) * self.j(Dm))
         eps = (Dm - dm) / r
         steps = np.arange(Dm, dm, -eps)
@@ -152,23 +219,30 @@ class Plank3D(Domain3D):
                 if verbose:
                     print('\nw: отсутствуют облака диаметром {}'.format(D))
                 continue
+            if free_space:
+                forbidden = self.__forbidden(clouds, D / 2)
             for k in range(n):
                 start_time = time.time()
                 while True:
-                    x, y = np.random.uniform(0., self.PX), np.random.uniform(0., self.PY)
+                    if free_space:
+                        free = np.flatnonzero(~forbidden)
+                        if not len(free):
+                            raise TimeoutError('no free space for clouds of diameter {}'.format(D))
+                        ci, cj = divmod(free[np.random.randint(len(free))], forbidden.shape[1])
+                        x, y = (ci + np.random.uniform()) * self.dx, (cj + np.random.uniform()) * self.dy
+                    else:
+                        x, y = np.random.uniform(0., self.PX), np.random.uniform(0., self.PY)
                     z = self.clouds_bottom
                     rx = ry = D / 2
                     H = eta * D * np.power(D / Dm, beta)
                     cloud = CylinderCloud((x, y, z), rx, ry, H)
                     if not cloud.belongs_q((self.PX, self.PY, self.PZ)):
                         continue
-                    intersections = False
-                    for c in clouds:
-                        if not cloud.disjoint_q(c):
-                            intersections = True
-                            break
-                    if not intersections:
+                    if grid.disjoint_q(cloud):
+                        grid.append(cloud)
                         clouds.append(cloud)
+                        if free_space:
+                            self.__forbid(forbidden, cloud, D / 2)
                         break
                     if time.time() - start_time > timeout:
                         raise TimeoutError('timeout exceeded')
@@ -176,18 +250,47 @@ class Plank3D(Domain3D):
             print()
         return clouds
 
+    def __forbid(self, forbidden: np.ndarray, cloud: CylinderCloud, r: float) -> None:
+        # ячейки, в любой точке которых центр нового облака с полуосями r даст пересечение с cloud
+        i0, i1 = max(int((cloud.x - cloud.rx - r) // self.dx) + 1, 0), int((cloud.x + cloud.rx + r) // self.dx)
+        j0, j1 = max(int((cloud.y - cloud.ry - r) // self.dy) + 1, 0), int((cloud.y + cloud.ry + r) // self.dy)
+        forbidden[i0:i1, j0:j1] = True
+
+    def __forbidden(self, clouds: list, r: float) -> np.ndarray:
+        """
+        Растр ячеек сетки Oxy, в которых не может находиться центр нового облака с полуосями r
+        (выход за границы области или пересечение с облаками clouds). Частично свободные ячейки
+        не исключаются - положение облака затем проверяется точно
+        """
+        forbidden = np.ones((self.Nx - 1, self.Ny - 1), dtype=bool)
+        forbidden[int(r // self.dx):int(np.ceil((self.PX - r) / self.dx)),
+                  int(r // self.dy):int(np.ceil((self.PY - r) / self.dy))] = False
+        for cloud in clouds:
+            self.__forbid(forbidden, cloud, r)
+        return forbidden
+
     def height_map2d_(self, cloudiness: list) -> np.ndarray:
+        """
+        :param cloudiness: список облаков
+        :return: 2D-распределение мощности облаков в проекции на плоскость Oxy
+        """
         hmap = np.zeros((self.Nx, self.Ny), dtype=float)
         for cloud in cloudiness:
-            for x in np.arange(cloud.x - cloud.rx, cloud.x + cloud.rx, self.dx):
-                for y in np.arange(cloud.y - cloud.ry, cloud.y + cloud.ry, self.dy):
-                    if cloud.includes_q((x, y, self.clouds_bottom)):
-                        hmap[self.i(x), self.j(y)] = cloud.height
+            if not (cloud.z <= self.clouds_bottom <= cloud.z + cloud.height):
+                continue
+            # узлы в прямоугольнике, описанном вокруг основания облака, и маска эллипса
+            x = np.arange(cloud.x - cloud.rx, cloud.x + cloud.rx, self.dx)
+            y = np.arange(cloud.y - cloud.ry, cloud.y + cloud.ry, self.dy)
+            inside = ((x - cloud.x) * (x - cloud.x) / (cloud.rx * cloud.rx))[:, None] + \
+                ((y - cloud.y) * (y - cloud.y) / (cloud.ry * cloud.ry))[None, :] <= 1
+            I, J = np.nonzero(inside)
+            hmap[(x[I] / self.PX * (self.Nx - 1)).astype(int),
+                 (y[J] / self.PY * (self.Ny - 1)).astype(int)] = cloud.height
         return hmap  # 2D array
 
     def height_map2d(self, Dm: float = 3., dm: float = 0., K: float = 100,
                      alpha: float = 1., beta: float = 0.5, eta: float = 1., seed: int = 42,
-                     timeout: float = 30., verbose=True) -> np.ndarray:
+                     timeout: float = 30., verbose=True, free_space: bool = False) -> np.ndarray:
         """
         :param Dm: максимальный диаметр облака, км
         :param dm: минимально возможный диаметр облака в км
@@ -198,19 +301,22 @@ class Plank3D(Domain3D):
         :param seed: состояние генератора случайных чисел (определяет положения облаков в 3D)
         :param timeout: максимальное время ожидания
         :param verbose: вывод доп. информации
+        :param free_space: выбирать положения облаков только среди свободных ячеек (см. generate_clouds)
         :return: 2D-распределение мощности облаков в проекции на плоскость Oxy
         """
-        cloudiness = self.generate_clouds(Dm, dm, K, alpha, beta, eta, seed, timeout, verbose)
+        cloudiness = self.generate_clouds(Dm, dm, K, alpha, beta, eta, seed, timeout, verbose, free_space)
         return self.height_map2d_(cloudiness)
 
     def liquid_water_(self, hmap2d: np.ndarray, const_w=False, mu0: float = 3.27, psi0: float = 0.67,
-                      _w: Callable = lambda _h: 0.132574 * np.power(_h, 2.30215)) -> np.ndarray:
-        return liquid_water(self, hmap2d, self.clouds_bottom, const_w, mu0, psi0, _w)
+                      _w: Callable = lambda _h: 0.132574 * np.power(_h, 2.30215),
+                      sparse: bool = False) -> Union[np.ndarray, SparseLiquidWater]:
+        return liquid_water(self, hmap2d, self.clouds_bottom, const_w, mu0, psi0, _w, sparse)
 
     def liquid_water(self, Dm: float = 3., dm: float = 0., K: float = 100,
                      alpha: float = 1., beta: float = 0.5, eta: float = 1., seed: int = 42,
                      const_w=False, mu0: float = 3.27, psi0: float = 0.67,
                      _w: Callable = lambda _h: 0.132574 * np.power(_h, 2.30215),
-                     timeout: float = 30., verbose=True) -> np.ndarray:
+                     timeout: float = 30., verbose=True,
+                     sparse: bool = False) -> Union[np.ndarray, SparseLiquidWater]:
         return liquid_water(self, self.height_map2d(Dm, dm, K, alpha, beta, eta, seed, timeout, verbose),
-                            self.clouds_bottom, const_w, mu0, psi0, _w)  # 3D array
+                            self.clouds_bottom, const_w, mu0, psi0, _w, sparse)  # 3D array
@@ -1,6 +1,8 @@
 #  -*- coding: utf-8 -*-
 from typing import Union
 from cpu.core.types import TensorLike
+from cpu.core.tables import AbsorptionTable
+from cpu.core.profiling import profiled
 from cpu.core.const import *
 import cpu.core.static.p676 as p676
 import cpu.core.static.weight_funcs as wf
@@ -11,9 +13,11 @@ import cpu.core.static.weight_funcs as wf
 """
 
 
+@profiled('attenuation.oxygen', 0)
 def oxygen(frequency: float,
            T: Union[float, TensorLike], P: Union[float, TensorLike],
-           rho: Union[float, TensorLike] = None, approx: bool = False) -> Union[float, TensorLike]:
+           rho: Union[float, TensorLike] = None, approx: bool = False,
+           table: AbsorptionTable = None) -> Union[float, TensorLike]:
     """
     Копия static.p676.gamma_oxygen(...)
 
@@ -22,16 +26,21 @@ def oxygen(frequency: float,
     :param P: атмосферное давление, мбар или гПа
     :param rho: абсолютная влажность, г/м^3
     :param approx: расчет по приближенной формуле
+    :param table: таблица коэффициентов поглощения (см. core.tables). Если задана, approx не учитывается
     :return: погонный коэффициент поглощения в кислороде (Дб/км)
     """
+    if table is not None:
+        return table.oxygen(frequency, T, P, rho)
     if approx:
         return p676.gamma_oxygen_approx(frequency, T, P)
     return p676.gamma_oxygen(frequency, T, P, rho)
 
 
+@profiled('attenuation.water_vapor', 0)
 def water_vapor(frequency: float,
                 T: Union[float, TensorLike], P: Union[float, TensorLike],
-                rho: Union[float, TensorLike], approx: bool = False) -> Union[float, TensorLike]:
+                rho: Union[float, TensorLike], approx: bool = False,
+                table: AbsorptionTable = None) -> Union[float, TensorLike]:
     """
     Копия static.p676.gamma_water_vapor(...)
 
@@ -40,13 +49,17 @@ def water_vapor(frequency: float,
     :param P: атмосферное давление, мбар или гПа
     :param rho: абсолютная влажность, г/м^3
     :param approx: расчет по приближенной формуле
+    :param table: таблица коэффициентов поглощения (см. core.tables). Если задана, approx не учитывается
     :return: погонный коэффициент поглощения в водяном паре (Дб/км)
     """
+    if table is not None:
+        return table.water_vapor(frequency, T, P, rho)
     if approx:
         return p676.gamma_water_vapor_approx(frequency, T, P, rho)
     return p676.gamma_water_vapor(frequency, T, P, rho)
 
 
+@profiled('attenuation.liquid_water', 0)
 def liquid_water_eff(frequency: float,
                      t_clouds: float, w: Union[float, TensorLike]) -> Union[float, TensorLike]:
     """
@@ -60,6 +73,7 @@ def liquid_water_eff(frequency: float,
     return np2dB * wf.kw(frequency, t_clouds) * w
 
 
+@profiled('attenuation.liquid_water', 0)
 def liquid_water(frequency: float,
                  T: Union[float, TensorLike], w: Union[float, TensorLike]) -> Union[float, TensorLike]:
     """
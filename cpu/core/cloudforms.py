@@ -65,3 +65,49 @@ class CylinderCloud:
         :return: Высота верхней границы облака, км
         """
         return self.z + self.height
+
+
+class CloudGrid:
+    def __init__(self, cell: float):
+        """
+        Пространственный индекс облаков - равномерная сетка на плоскости Oxy.
+        Каждое облако регистрируется во всех ячейках, которые пересекает прямоугольник, описанный
+        вокруг его основания, поэтому проверка нового облака затрагивает только соседние облака
+
+        :param cell: размер ячейки сетки, км (рекомендуется не меньше максимального диаметра облака)
+        """
+        self.cell = cell
+        self.clouds = []
+        self._cells = {}
+
+    def __keys(self, cloud: CylinderCloud) -> list:
+        i0, i1 = int((cloud.x - cloud.rx) // self.cell), int((cloud.x + cloud.rx) // self.cell)
+        j0, j1 = int((cloud.y - cloud.ry) // self.cell), int((cloud.y + cloud.ry) // self.cell)
+        return [(i, j) for i in range(i0, i1 + 1) for j in range(j0, j1 + 1)]
+
+    def neighbours(self, cloud: CylinderCloud) -> list:
+        """
+        :param cloud: объект CylinderCloud
+        :return: облака, которые могут пересекаться с cloud по осям Ox и Oy
+        """
+        indices = set()
+        for key in self.__keys(cloud):
+            indices.update(self._cells.get(key, ()))
+        return [self.clouds[n] for n in sorted(indices)]
+
+    def disjoint_q(self, cloud: CylinderCloud) -> bool:
+        """
+        Проверить, не пересекается ли облако (cloud) ни с одним из облаков индекса (см. CylinderCloud.disjoint_q)
+
+        :param cloud: объект CylinderCloud
+        :return: True/False
+        """
+        return all(cloud.disjoint_q(c) for c in self.neighbours(cloud))
+
+    def append(self, cloud: CylinderCloud) -> None:
+        """
+        Добавить облако в индекс
+        """
+        for key in self.__keys(cloud):
+            self._cells.setdefault(key, []).append(len(self.clouds))
+        self.clouds.append(cloud)
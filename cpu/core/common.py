@@ -6,25 +6,15 @@ import cpu.core.math as math
 
 def diap(a: Union[Number, Tensor1D_or_3D], start: int, stop: int,
          step: int = 1) -> Union[Number, TensorLike]:
-    rank = math.rank(a)
-    if rank == 0:
+    if math.rank(a) == 0:
         return a
-    if rank == 1:
-        return a[start:stop:step]
-    if rank == 3:
-        return a[:, :, start:stop:step]
-    raise RuntimeError('wrong rank')
+    return a[..., start:stop:step]
 
 
 def at(a: Union[float, Tensor1D_or_3D], index: int) -> Union[Number, Tensor2D]:
-    rank = math.rank(a)
-    if rank == 0:
+    if math.rank(a) == 0:
         return a
-    if rank == 1:
-        return a[index]
-    if rank == 3:
-        return a[:, :, index]
-    raise RuntimeError('wrong rank')
+    return a[..., index]
 
 
 def cx(a: Union[Number, TensorLike], boundaries_profile: List[Tuple[int, int]] = None, height: int = None):
@@ -33,7 +23,5 @@ def cx(a: Union[Number, TensorLike], boundaries_profile: List[Tuple[int, int]] =
     rank = math.rank(a)
     if rank in [0, 1]:
         return a
-    if rank in [2, 3]:
-        start, stop = boundaries_profile[height]
-        return a[start:stop]
-    raise RuntimeError('wrong rank')
+    start, stop = boundaries_profile[height]
+    return a[start:stop]
@@ -1,8 +1,9 @@
 #  -*- coding: utf-8 -*-
 from typing import Union, Callable, Tuple, List
-from cpu.core.types import Number, Tensor1D, Tensor2D, Tensor1D_or_3D
+from cpu.core.types import Number, Tensor1D, Tensor2D, Tensor3D, Tensor1D_or_3D
 import cpu.core.math as math
 from cpu.core.common import diap, at
+from cpu.core.profiling import profiled
 import numpy as np
 
 
@@ -35,11 +36,76 @@ def boole(a: Tensor1D_or_3D, lower: int, upper: int,
                            diap(dh, lower + 4, upper, 4), axis=-1)) / 45.
 
 
+def shear_table(shape: Union[Tuple[int, ...], List[int]], dh: Union[float, Tensor1D],
+                theta: float = 0., px: float = 50.,
+                incline: Union[str, None] = 'left') -> Tuple[np.ndarray, int]:
+    """
+    Таблица перехода к наклонной сетке (см. shear)
+
+    :param shape: форма 3D-поля (возможно, с дополнительной частотной осью перед высотной)
+    :param dh: шаг по высоте (число или 1D-массив), км
+    :param theta: зенитный угол наблюдения, рад.
+    :param px: горизонтальная протяженность по Ox, км
+    :param incline: наклон траектории наблюдения (left/right)
+    :return: номера начальных узлов по Ox для каждого уровня (1D-массив) и размер наклонной сетки по Ox
+    """
+    Ix, Iz = shape[0], shape[-1]
+
+    if isinstance(dh, float) or math.rank(dh) == 0:
+        py = Iz * dh
+    elif math.rank(dh) == 1:
+        py = math.sum_(dh)
+    else:
+        raise RuntimeError('wrong rank')
+
+    dx = math.tan(theta) * py    # Определим смещение по Ox в км
+    N = Ix / px                # Определим, сколько узлов приходится на 1 км
+    di = dx * N                # Определим смещение по Ox в узлах
+    if di >= Ix:
+        raise RuntimeError('too big angle for such an array')
+
+    Delta = int(Ix - di)
+    p = (np.arange(Iz) / (Iz - 1)).astype(np.result_type(di, 1.))
+    if incline == 'left':
+        start = (di - di * p).astype(int)
+    else:
+        start = (0 + di * p).astype(int)
+    return start, Delta
+
+
+@profiled('integrate.shear')
+def shear(a: Tensor3D, dh: Union[float, Tensor1D],
+          theta: float = 0., px: float = 50.,
+          incline: Union[str, None] = 'left',
+          table: Tuple[np.ndarray, int] = None) -> Tuple[Tensor3D, List[Tuple[int, int]]]:
+    """
+    Переход к наклонной сетке: каждый высотный уровень 3D-поля сдвигается по Ox так,
+    чтобы вертикальный столбец результата соответствовал траектории наблюдения под углом theta
+
+    :param a: 3D-поле (возможно, с дополнительной частотной осью перед высотной)
+    :param dh: шаг по высоте (число или 1D-массив), км
+    :param theta: зенитный угол наблюдения, рад.
+    :param px: горизонтальная протяженность по Ox, км
+    :param incline: наклон траектории наблюдения (left/right)
+    :param table: заранее рассчитанная таблица перехода (см. shear_table)
+    :return: 3D-поле на наклонной сетке и список границ (start, stop) по Ox для каждого уровня
+    """
+    if table is None:
+        table = shear_table(a.shape, dh, theta, px, incline)
+    start, Delta = table
+    index = start + np.arange(Delta)[:, None]
+    b = np.take_along_axis(a, index.reshape([Delta] + [1] * (math.rank(a) - 2) + [-1]), axis=0)
+    return b, list(zip(start.tolist(), (start + Delta).tolist()))
+
+
+@profiled('integrate.limits')
 def limits(a: Tensor1D_or_3D, lower: int, upper: int,
            dh: Union[float, Tensor1D], method='trapz',
            theta: float = 0., px: float = 50., incline: Union[str, None] = 'left',
-           boundaries: bool = False) -> Union[Number, Tensor2D, Tuple[Union[Number, Tensor2D],
-                                                                      Union[List[Tuple[int, int]], None]]]:
+           boundaries: bool = False,
+           table: Tuple[np.ndarray, int] = None) -> Union[Number, Tensor2D,
+                                                           Tuple[Union[Number, Tensor2D],
+                                                                 Union[List[Tuple[int, int]], None]]]:
     if np.isclose(theta, 0.):
         if method.lower() == 'trapz':
             a = trapz(a, lower, upper, dh)
@@ -53,69 +119,148 @@ def limits(a: Tensor1D_or_3D, lower: int, upper: int,
         return a
 
     rank = math.rank(a)
-    if rank == 1:
+    if rank in [1, 2]:     # высотный профиль (для массива частот - [частоты, высоты])
         a = limits(a, lower, upper, dh, method) / math.cos(theta)
 
         if boundaries:
             return a, None
         return a
 
-    elif rank == 3:
-        Ix, Iy, Iz = a.shape
-
-        if isinstance(dh, float) or math.rank(dh) == 0:
-            py = Iz * dh
-        elif math.rank(dh) == 1:
-            py = math.sum_(dh)
-        else:
-            raise RuntimeError('wrong rank')
-
-        dx = math.tan(theta) * py    # Определим смещение по Ox в км
-        N = Ix / px                # Определим, сколько узлов приходится на 1 км
-        di = dx * N                # Определим смещение по Ox в узлах
-        if di >= Ix:
-            raise RuntimeError('too big angle for such an array')
-
-        Delta = int(Ix - di)
-        b = math.as_variable(math.zeros([Delta, Iy, Iz]))
-
-        START, STOP = [], []
-        if incline == 'left':
-            for n in range(0, Iz, 1):
-                p = n / (Iz-1)
-                start = int(di - di * p)
-                stop = start + Delta
-                b[:, :, n] = a[start:stop, :, n]
-                START.append(start)
-                STOP.append(stop)
-        else:
-            for n in range(0, Iz, 1):
-                p = n / (Iz - 1)
-                start = int(0 + di * p)
-                stop = start + Delta
-                b[:, :, n] = a[start:stop, :, n]
-                START.append(start)
-                STOP.append(stop)
-
+    elif rank in [3, 4]:   # 3D-поле (для массива частот - [x, y, частоты, высоты])
+        b, boundaries_profile = shear(a, dh, theta, px, incline, table)
         a = limits(b, lower, upper, dh, method)
         if boundaries:
-            return a, list(zip(START, STOP))
+            return a, boundaries_profile
         return a
 
     raise RuntimeError('wrong rank. Only 1D- or 3D-arrays')
 
 
 def full(a: Tensor1D_or_3D, dh: Union[float, Tensor1D], method='trapz',
-         theta: float = 0., px: float = 50., incline: str = 'left') -> Union[Number, Tensor2D]:
-    return limits(a, 0, math.len_(a) - 1, dh, method, theta, px, incline)
+         theta: float = 0., px: float = 50., incline: str = 'left',
+         table: Tuple[np.ndarray, int] = None) -> Union[Number, Tensor2D]:
+    return limits(a, 0, math.len_(a) - 1, dh, method, theta, px, incline, table=table)
 
 
+@profiled('integrate.callable_f')
 def callable_f(f: Callable, lower: int, upper: int,
                dh: Union[float, Tensor1D], method='trapz',
                theta: float = 0., px: float = 50., incline: str = 'left',
                boundaries: bool = False) -> Union[Number, Tensor2D, Tuple[Union[Number, Tensor2D],
                                                                           Union[List[Tuple[int, int]], None]]]:
     a = math.as_tensor([f(i) for i in range(lower, upper + 1, 1)])
-    if math.rank(a) == 3:
-        a = math.transpose(a, axes=[1, 2, 0])
+    if math.rank(a) > 1:
+        a = math.move_axis(a, 0, -1)
     return limits(a, lower, upper, dh, method, theta, px, incline, boundaries=boundaries)
+
+
+def __rule(method: str) -> Tuple[float, List[float], float]:
+    """
+    Весовые коэффициенты квадратурной формулы
+
+    :param method: метод интегрирования
+    :return: коэффициент при крайних узлах, коэффициенты при внутренних узлах (в зависимости от остатка
+        от деления номера узла, отсчитанного от нижнего предела, на период формулы), общий знаменатель
+    """
+    if method.lower() == 'trapz':
+        return 1., [2.], 2.
+    if method.lower() == 'simpson':
+        return 1., [2., 4.], 3.
+    return 14., [28., 64., 24., 64.], 45.   # boole
+
+
+@profiled('integrate.cumulative')
+def cumulative(a: Tensor1D_or_3D, dh: Union[float, Tensor1D], method='trapz',
+               direction: str = 'up') -> Tensor1D_or_3D:
+    """
+    Интегралы по всем частичным отрезкам [0, h] (direction='up') или [h, N-1] (direction='down')
+    за один проход с помощью накопленных сумм. Для каждого h результат совпадает
+    с limits(a, 0, h, ...) или limits(a, h, N-1, ...) соответственно
+
+    :param a: 1D- или 3D-массив (интегрирование по последней оси)
+    :param dh: шаг по высоте (число или 1D-массив), км
+    :param method: метод интегрирования
+    :param direction: 'up' - от нижней границы до уровня h; 'down' - от уровня h до верхней границы
+    :return: массив той же формы, что и a
+    """
+    end, c, den = __rule(method)
+    m = len(c)
+    a = math.as_tensor(a)
+    n = math.len_(a)
+    k = np.arange(n)
+    ad = a * dh
+
+    if direction == 'up':
+        w = math.as_tensor([c[i % m] for i in range(n)])
+        w[0] = 0.
+        s = math.cumsum(ad * w, axis=-1)
+        interior = s[..., np.maximum(k - 1, 0)]
+        return (end * (ad[..., :1] + ad) + interior) / den
+
+    if direction == 'down':
+        interior = math.zeros_like(ad)
+        for r in range(m):
+            w = math.as_tensor([c[(i - r) % m] for i in range(n)])
+            w[-1] = 0.
+            s = math.cumsum(ad * w, axis=-1, reverse=True)
+            idx = k[k % m == r]
+            interior[..., idx] = s[..., np.minimum(idx + 1, n - 1)]
+        return (end * (ad + ad[..., -1:]) + interior) / den
+
+    raise ValueError('direction must be \'up\' or \'down\'')
+
+
+@profiled('integrate.cumulative_adjoint')
+def cumulative_adjoint(e: Tensor1D_or_3D, dh: Union[float, Tensor1D], method='trapz',
+                       direction: str = 'up') -> Tensor1D_or_3D:
+    """
+    Обратный проход для cumulative: по производным некоторой величины L по всем частичным интегралам
+    e[h] = dL / d cumulative(a, ...)[h] находит производные dL / da[j] для каждого узла j за O(N)
+
+    :param e: 1D- или 3D-массив (высотная ось - последняя)
+    :param dh: шаг по высоте (число или 1D-массив), км
+    :param method: метод интегрирования
+    :param direction: 'up' или 'down' (см. cumulative)
+    :return: массив той же формы, что и e
+    """
+    end, c, den = __rule(method)
+    m = len(c)
+    e = math.as_tensor(e)
+    n = math.len_(e)
+    k = np.arange(n)
+    total = math.sum_(e, axis=-1)[..., None]
+
+    if direction == 'up':
+        # a[j] (j > 0) входит во внутреннюю часть всех интегралов [0, h] с h > j
+        w = math.as_tensor([c[i % m] for i in range(n)])
+        w[0] = 0.
+        tail = math.cumsum(e, axis=-1, reverse=True) - e
+        out = end * e + w * tail
+        out[..., 0] += end * total[..., 0]
+        return out * dh / den
+
+    if direction == 'down':
+        # a[j] (j < N-1) входит во внутреннюю часть интегралов [h, N-1] с h < j с весом c[(j - h) % m]
+        out = end * e
+        for r in range(m):
+            head = math.cumsum(e * math.as_tensor(k % m == r), axis=-1) - e * math.as_tensor(k % m == r)
+            w = math.as_tensor([c[(i - r) % m] for i in range(n)])
+            w[-1] = 0.
+            out += w * head
+        out[..., -1] += end * total[..., 0]
+        return out * dh / den
+
+    raise ValueError('direction must be \'up\' or \'down\'')
+
+
+def weights(n: int, dh: Union[float, Tensor1D], method='trapz') -> Tensor1D:
+    """
+    Весовые коэффициенты квадратурной формулы: full(a, dh, method) = sum(weights(...) * a)
+
+    :param n: число узлов
+    :param dh: шаг по высоте (число или 1D-массив), км
+    :param method: метод интегрирования
+    """
+    e = math.zeros(n)
+    e[-1] = 1.
+    return cumulative_adjoint(e, dh, method, 'up')
@@ -17,6 +17,12 @@ def sum_(a: TensorLike, axis: int = None) -> Union[Number, TensorLike]:
     return np.sum(a, axis=axis, dtype=cpu_float)
 
 
+def cumsum(a: TensorLike, axis: int = -1, reverse: bool = False) -> TensorLike:
+    if reverse:
+        return np.flip(np.cumsum(np.flip(a, axis), axis=axis, dtype=cpu_float), axis)
+    return np.cumsum(a, axis=axis, dtype=cpu_float)
+
+
 def transpose(a: TensorLike, axes=None) -> TensorLike:
     return np.transpose(a, axes)
 
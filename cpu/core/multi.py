@@ -1,31 +1,62 @@
 #  -*- coding: utf-8 -*-
 from typing import Union, List, Tuple, Callable
-from multiprocessing import Manager, Process
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+import os
 from cpu.core.types import cpu_float
 import numpy as np
 
 
-def do(processes: list, n_workers: int) -> None:
-    for i in range(0, len(processes), n_workers):
-        for j in range(i, i + n_workers):
-            if j < len(processes):
-                processes[j].start()
-        for j in range(i, i + n_workers):
-            if j < len(processes):
-                processes[j].join()
+def __task(func: Callable, args: Union[Tuple, List], f: float):
+    return func(f, *args)
+
+
+# задача рабочего процесса: func и args передаются процессу один раз при запуске (см. parallel)
+__worker_task = None
+
+
+def __init_worker(func: Callable, args: Union[Tuple, List]):
+    global __worker_task
+    __worker_task = partial(__task, func, args)
+
+
+def __worker(f: float):
+    return __worker_task(f)
 
 
 def parallel(enumerable: Union[np.ndarray, List[float]],
              func: Callable, args: Union[Tuple, List],
-             n_workers: int) -> np.ndarray:
+             n_workers: int = None, backend: str = 'process', chunksize: int = None) -> np.ndarray:
+    """
+    Параллельный расчет func(f, *args) для каждого f из enumerable.
+    Вычисления выполняются в рабочих процессах (потоках), результаты возвращаются в исходном порядке
+
+    :param enumerable: список значений (например, частот)
+    :param func: вычисляемая функция. Для backend='process' func и args должны сериализоваться (pickle);
+        они передаются каждому процессу один раз при его запуске
+    :param args: дополнительные аргументы func
+    :param n_workers: количество одновременно работающих процессов (потоков). По умолчанию - число ядер
+    :param backend: 'process' - пул процессов, 'thread' - пул потоков
+    :param chunksize: количество задач, передаваемых процессу за один раз. По умолчанию задачи
+        распределяются примерно поровну (по 4 порции на процесс)
+    """
     if not n_workers:
-        n_workers = len(enumerable)
-    with Manager() as manager:
-        out = manager.list()
-        processes = []
-        for i, f in enumerate(enumerable):
-            p = Process(target=out.append, args=((i, func(f, *args)),))
-            processes.append(p)
-        do(processes, n_workers)
-        out = list(out)
-    return np.asarray([val for _, val in sorted(out, key=lambda item: item[0])], dtype=cpu_float)
+        n_workers = os.cpu_count() or 1
+    n_workers = min(n_workers, max(len(enumerable), 1))
+    task = partial(__task, func, args)
+    if n_workers == 1:
+        out = [task(f) for f in enumerable]
+    else:
+        if chunksize is None:
+            chunksize = max(1, int(np.ceil(len(enumerable) / (4 * n_workers))))
+        if backend == 'thread':
+            executor = ThreadPoolExecutor(max_workers=n_workers)
+        elif backend == 'process':
+            # func и args передаются каждому процессу один раз, в порциях задач - только частоты
+            executor = ProcessPoolExecutor(max_workers=n_workers, initializer=__init_worker, initargs=(func, args))
+            task = __worker
+        else:
+            raise ValueError('backend must be \'process\' or \'thread\'')
+        with executor:
+            out = list(executor.map(task, enumerable, chunksize=chunksize))
+    return np.asarray(out, dtype=cpu_float)
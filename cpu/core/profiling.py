@@ -0,0 +1,154 @@
+#  -*- coding: utf-8 -*-
+from typing import Callable, Dict, List, Union, Any
+from functools import wraps
+import time
+import threading
+import numpy as np
+
+
+"""
+Профилирование этапов расчета (поглощение, интегрирование, переход к наклонной сетке, поверхность, ...).
+Пока не зарегистрирован ни один обработчик (см. Profiler), декорированные функции вызываются напрямую
+"""
+
+
+# зарегистрированные обработчики: hook(stage, frequency, elapsed, nbytes)
+_hooks: List[Callable] = []
+# выполняющиеся в данный момент в каждом потоке этапы (вложенные вызовы того же этапа не учитываются повторно)
+# и частота объемлющего этапа (для этапов без аргумента частоты, например, интегрирования)
+_local = threading.local()
+
+
+def _running() -> set:
+    if not hasattr(_local, 'running'):
+        _local.running = set()
+    return _local.running
+
+
+def register(hook: Callable) -> None:
+    """
+    Зарегистрировать обработчик hook(stage, frequency, elapsed, nbytes), вызываемый после каждого этапа
+
+    :param hook: stage - имя этапа, frequency - частота (число, кортеж частот или None; для этапов
+        без аргумента частоты - частота объемлющего этапа),
+        elapsed - время выполнения (с), nbytes - объем результата (байт)
+    """
+    _hooks.append(hook)
+
+
+def unregister(hook: Callable) -> None:
+    _hooks.remove(hook)
+
+
+def _nbytes(a: Any) -> int:
+    if isinstance(a, (tuple, list)):
+        return sum(_nbytes(b) for b in a)
+    if isinstance(a, dict):
+        return sum(_nbytes(b) for b in a.values())
+    return int(getattr(a, 'nbytes', 0))
+
+
+def _key(frequency: Any) -> Union[float, tuple, None]:
+    if frequency is None:
+        return None
+    if np.ndim(frequency) == 0:
+        return round(float(frequency), 4)
+    return tuple(round(float(f), 4) for f in np.ravel(frequency))
+
+
+def profiled(stage: str, frequency: int = None) -> Callable:
+    """
+    Декоратор этапа расчета
+
+    :param stage: имя этапа
+    :param frequency: номер позиционного аргумента, содержащего частоту (или имя аргумента 'frequency').
+        Если не указан, этап учитывается под частотой объемлющего этапа
+    """
+    def decorator(func: Callable) -> Callable:
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _hooks:
+                return func(*args, **kwargs)
+            running = _running()
+            if stage in running:
+                return func(*args, **kwargs)
+            outer = getattr(_local, 'frequency', None)
+            f = args[frequency] if frequency is not None and len(args) > frequency else kwargs.get('frequency')
+            f = outer if f is None else _key(f)
+            running.add(stage)
+            _local.frequency = f
+            try:
+                start = time.perf_counter()
+                out = func(*args, **kwargs)
+                elapsed = time.perf_counter() - start
+            finally:
+                running.discard(stage)
+                _local.frequency = outer
+            nbytes = _nbytes(out)
+            for hook in list(_hooks):
+                hook(stage, f, elapsed, nbytes)
+            return out
+        return wrapper
+    return decorator
+
+
+class Profiler:
+    def __init__(self):
+        """
+        Счетчики вызовов, суммарного времени и объема результатов по этапам и частотам.
+        Используется как контекстный менеджер:
+
+            with Profiler() as p:
+                satellite.brightness_temperature(...)
+            print(p.summary())
+
+        Время вложенных этапов входит во время объемлющих. Этапы без аргумента частоты (интегрирование,
+        переход к наклонной сетке) учитываются под частотой объемлющего этапа. Время и объем результата
+        расчета для массива частот делятся поровну между частотами массива
+        """
+        self.stages = {}
+        self._lock = threading.Lock()   # обработчик может вызываться из нескольких потоков
+
+    def __call__(self, stage: str, frequency: Union[float, tuple, None], elapsed: float, nbytes: int) -> None:
+        frequencies = frequency if isinstance(frequency, tuple) else (frequency, )
+        with self._lock:
+            s = self.stages.setdefault(stage, {'calls': 0, 'time': 0., 'bytes': 0, 'frequencies': {}})
+            s['calls'] += 1
+            s['time'] += elapsed
+            s['bytes'] += nbytes
+            for frequency in frequencies:
+                f = s['frequencies'].setdefault(frequency, {'calls': 0, 'time': 0., 'bytes': 0})
+                f['calls'] += 1
+                f['time'] += elapsed / len(frequencies)
+                f['bytes'] += nbytes // len(frequencies)
+
+    def __enter__(self) -> 'Profiler':
+        register(self)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        unregister(self)
+
+    def reset(self) -> None:
+        self.stages = {}
+
+    def report(self) -> Dict[str, Dict]:
+        """
+        :return: словарь {этап: {'calls', 'time', 'bytes', 'frequencies': {частота: {'calls', 'time', 'bytes'}}}}
+        """
+        return {stage: dict(s, frequencies={f: dict(v) for f, v in s['frequencies'].items()})
+                for stage, s in self.stages.items()}
+
+    def summary(self, frequencies: bool = False) -> str:
+        """
+        :param frequencies: выводить строки по отдельным частотам
+        :return: таблица этапов, упорядоченных по убыванию суммарного времени
+        """
+        lines = ['{:<40} {:>8} {:>12} {:>12}'.format('stage', 'calls', 'time, s', 'MB')]
+        for stage, s in sorted(self.stages.items(), key=lambda item: -item[1]['time']):
+            lines.append('{:<40} {:>8} {:>12.4f} {:>12.2f}'.format(stage, s['calls'], s['time'], s['bytes'] / 2 ** 20))
+            if frequencies:
+                for f, v in s['frequencies'].items():
+                    lines.append('  {:<38} {:>8} {:>12.4f} {:>12.2f}'.format(
+                        str(f), v['calls'], v['time'], v['bytes'] / 2 ** 20))
+        return '\n'.join(lines)
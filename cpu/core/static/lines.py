@@ -1,3 +1,4 @@
+import numpy as np
 
 oxygen = {
     50.474214: [0, 0.975, 9.651, 6.690, 0.0, 2.566, 6.850],
@@ -83,3 +84,14 @@ water_vapor = {
     987.926764: [0, 134.6, 0.257, 29.85, 0.68, 4.550, 0.90],
     1780.000000: [0, 17506, 0.952, 196.3, 2.00, 24.15, 5.00],
 }
+
+
+"""
+Те же каталоги в виде непрерывных массивов NumPy (для векторизованного суммирования по линиям):
+частоты линий в ГГц и параметры линий, строка k - k-й параметр всех линий
+"""
+oxygen_frequencies = np.ascontiguousarray(list(oxygen.keys()), dtype=float)
+oxygen_parameters = np.ascontiguousarray(np.transpose(list(oxygen.values())), dtype=float)
+
+water_vapor_frequencies = np.ascontiguousarray(list(water_vapor.keys()), dtype=float)
+water_vapor_parameters = np.ascontiguousarray(np.transpose(list(water_vapor.values())), dtype=float)
@@ -4,11 +4,14 @@ from cpu.core.types import TensorLike, Tensor2D
 from cpu.core.const import *
 import cpu.core.math as math
 import cpu.core.static.lines as lines
+import numpy as np
 
 """
 Рекомендации Международного Союза Электросвязи Rec.ITU-R P.676-3 и P.676-12
 """
 
+chunk_size = 2 ** 16   # макс. число элементов (узлы x спектральные линии) в одном векторизованном проходе
+
 
 def H1(frequency: float) -> float:
     """
@@ -38,10 +41,32 @@ def H2(frequency: float, rainQ: bool = False) -> float:
                  2.5 / ((f - 325.4) * (f - 325.4) + 4))
 
 
-def gamma_oxygen_approx(frequency: float,
+def __gamma_oxygen_approx_low(f: Union[float, TensorLike],
+                              rp: Union[float, TensorLike], rt: Union[float, TensorLike]):
+    return (7.27 * rt / (f * f + 0.351 * rp * rp * rt * rt) +
+            7.5 / ((f - 57) * (f - 57) + 2.44 * rp * rp * rt * rt * rt * rt * rt)) * \
+        f * f * rp * rp * rt * rt / 1000
+
+
+def __gamma_oxygen_approx_high(f: Union[float, TensorLike],
+                               rp: Union[float, TensorLike], rt: Union[float, TensorLike]):
+    return (2 / 10000 * math.pow_(rt, 1.5) * (1 - 1.2 / 100000 * math.pow_(f, 1.5)) +
+            4 / ((f - 63) * (f - 63) + 1.5 * rp * rp * rt * rt * rt * rt * rt) +
+            0.28 * rt * rt / ((f - 118.75) * (f - 118.75) + 2.84 * rp * rp * rt * rt)) * \
+        f * f * rp * rp * rt * rt / 1000
+
+
+def __gamma_oxygen_approx_mid(f: Union[float, TensorLike],
+                              rp: Union[float, TensorLike], rt: Union[float, TensorLike]):
+    return (f - 60) * (f - 63) / 18 * __gamma_oxygen_approx_low(57., rp, rt) - \
+        1.66 * rp * rp * math.pow_(rt, 8.5) * (f - 57) * (f - 63) + \
+        (f - 57) * (f - 60) / 18 * __gamma_oxygen_approx_high(63., rp, rt)
+
+
+def gamma_oxygen_approx(frequency: Union[float, TensorLike],
                  T: Union[float, TensorLike], P: Union[float, TensorLike]) -> Union[float, TensorLike]:
     """
-    :param frequency: частота излучения в ГГц
+    :param frequency: частота излучения в ГГц (число или массив частот, согласованный по форме с T и P)
     :param T: термодинамическая температура, градусы Цельсия
     :param P: атмосферное давление, мбар или гПа
     :return: погонный коэффициент поглощения в кислороде (Дб/км)
@@ -49,24 +74,25 @@ def gamma_oxygen_approx(frequency: float,
     rp = P / 1013
     rt = 288 / (273 + T)
     f = frequency
+    if math.rank(f) > 0:
+        gamma = 0
+        for cond, formula in [(f <= 57, __gamma_oxygen_approx_low),
+                              ((63 <= f) & (f <= 350), __gamma_oxygen_approx_high),
+                              ((57 < f) & (f < 63), __gamma_oxygen_approx_mid)]:
+            if np.any(cond):
+                gamma = np.where(cond, formula(f, rp, rt), gamma)
+        return gamma
     gamma = 0
     if f <= 57:
-        gamma = (7.27 * rt / (f * f + 0.351 * rp * rp * rt * rt) +
-                 7.5 / ((f - 57) * (f - 57) + 2.44 * rp * rp * rt * rt * rt * rt * rt)) * \
-                f * f * rp * rp * rt * rt / 1000
+        gamma = __gamma_oxygen_approx_low(f, rp, rt)
     elif 63 <= f <= 350:
-        gamma = (2 / 10000 * math.pow_(rt, 1.5) * (1 - 1.2 / 100000 * math.pow_(f, 1.5)) +
-                 4 / ((f - 63) * (f - 63) + 1.5 * rp * rp * rt * rt * rt * rt * rt) +
-                 0.28 * rt * rt / ((f - 118.75) * (f - 118.75) + 2.84 * rp * rp * rt * rt)) * \
-                f * f * rp * rp * rt * rt / 1000
+        gamma = __gamma_oxygen_approx_high(f, rp, rt)
     elif 57 < f < 63:
-        gamma = (f - 60) * (f - 63) / 18 * gamma_oxygen_approx(57., T, P) - \
-                1.66 * rp * rp * math.pow_(rt, 8.5) * (f - 57) * (f - 63) + \
-                (f - 57) * (f - 60) / 18 * gamma_oxygen_approx(63., T, P)
+        gamma = __gamma_oxygen_approx_mid(f, rp, rt)
     return gamma
 
 
-def gamma_water_vapor_approx(frequency: float,
+def gamma_water_vapor_approx(frequency: Union[float, TensorLike],
                       T: Union[float, TensorLike], P: Union[float, TensorLike],
                       rho: Union[float, TensorLike]) -> Union[float, TensorLike]:
     """
@@ -80,7 +106,7 @@ def gamma_water_vapor_approx(frequency: float,
     rt = 288 / (273 + T)
     f = frequency
     gamma = 0
-    if f <= 350:
+    if math.rank(f) > 0 or f <= 350:
         gamma = (3.27 / 100 * rt +
                  1.67 / 1000 * rho * rt * rt * rt * rt * rt * rt * rt / rp +
                  7.7 / 10000 * math.pow_(f, 0.5) +
@@ -88,6 +114,8 @@ def gamma_water_vapor_approx(frequency: float,
                  11.73 * rt / ((f - 183.31) * (f - 183.31) + 11.85 * rp * rp * rt) +
                  4.01 * rt / ((f - 325.153) * (f - 325.153) + 10.44 * rp * rp * rt)) * \
                 f * f * rho * rp * rt / 10000
+        if math.rank(f) > 0:
+            gamma = np.where(f <= 350, gamma, 0)
     return gamma
 
 
@@ -100,32 +128,54 @@ def __N_d(f: float,
     )
 
 
-def __N_oxygen(f: float,
+def __line_chunks(n_lines: int, *fields: Union[float, TensorLike]):
+    """
+    Разбиение каталога линий на части так, чтобы промежуточный массив (узлы x линии)
+    не превышал chunk_size элементов
+    """
+    n = max(1, chunk_size // np.broadcast(*fields).size)
+    return [(i, min(i + n, n_lines)) for i in range(0, n_lines, n)]
+
+
+def __line_shapes(f: Union[float, TensorLike], f_i: np.ndarray, dtype) -> tuple:
+    """
+    Зависящие только от частоты множители формы линий (вычисляются в двойной точности)
+
+    :return: f / f_i, f_i - f, f_i + f с последней осью по линиям
+    """
+    f = np.asarray(f, dtype=float)[..., None]
+    return (f / f_i).astype(dtype), (f_i - f).astype(dtype), (f_i + f).astype(dtype)
+
+
+def __N_oxygen(f: Union[float, TensorLike],
                t: Union[float, TensorLike], p: Union[float, TensorLike],
                rho: Union[float, TensorLike]):
     e = rho * t / 216.7
-    th = 300 / t
+    th = np.asarray(300 / t)
     N = 0.
     _c_1 = p * th * th * th / 10000000
     _c_2 = 1. - th
     _c_3 = 1.1 * e * th
     _c_4 = (p + e) * math.pow_(th, 0.8) / 10000
-    for i, f_i in enumerate(lines.oxygen.keys()):
-        a = lines.oxygen[f_i]
+    # суммирование по линиям: поля дополняются последней осью, по которой расположены линии
+    _p, _th, _c_1, _c_2, _c_3, _c_4 = (np.asarray(x)[..., None] for x in (p, th, _c_1, _c_2, _c_3, _c_4))
+    for lo, hi in __line_chunks(len(lines.oxygen_frequencies), f, t, p, rho):
+        a = lines.oxygen_parameters[:, lo:hi].astype(th.dtype)
+        ratio, minus, plus = __line_shapes(f, lines.oxygen_frequencies[lo:hi], th.dtype)
         S_i = a[1] * _c_1 * math.exp(a[2] * _c_2)
-        df_i = a[3] / 10000 * (p * math.pow_(th, 0.8 - a[4]) + _c_3)
+        df_i = a[3] / 10000 * (_p * math.pow_(_th, 0.8 - a[4]) + _c_3)
         df_i = math.sqrt(df_i * df_i + 2.25 / 1000000)
-        delta_i = (a[5] + a[6] * th) * _c_4
-        F_i = f / f_i * (
-            (df_i - delta_i * (f_i - f)) / ((f_i - f) * (f_i - f) + df_i * df_i) +
-            (df_i - delta_i * (f_i + f)) / ((f_i + f) * (f_i + f) + df_i * df_i)
+        delta_i = (a[5] + a[6] * _th) * _c_4
+        F_i = ratio * (
+            (df_i - delta_i * minus) / (minus * minus + df_i * df_i) +
+            (df_i - delta_i * plus) / (plus * plus + df_i * df_i)
         )
-        N = N + S_i * F_i
-    d = 5.6 * _c_4
+        N = N + np.sum(S_i * F_i, axis=-1)
+    d = 5.6 * _c_4[..., 0]
     return N + __N_d(f, th, p, d)
 
 
-def gamma_oxygen(frequency: float,
+def gamma_oxygen(frequency: Union[float, TensorLike],
                  T: Union[float, TensorLike], P: Union[float, TensorLike],
                  rho: Union[float, TensorLike]) -> Union[float, TensorLike]:
     """
@@ -138,30 +188,34 @@ def gamma_oxygen(frequency: float,
     return 0.1820 * frequency * __N_oxygen(frequency, T + 273.15, P, rho)
 
 
-def __N_water_vapor(f: float,
-               t: Union[float, TensorLike], p: Union[float, TensorLike],
-               rho: Union[float, TensorLike]):
+def __N_water_vapor(f: Union[float, TensorLike],
+                    t: Union[float, TensorLike], p: Union[float, TensorLike],
+                    rho: Union[float, TensorLike]):
     e = rho * t / 216.7
-    th = 300 / t
+    th = np.asarray(300 / t)
     N = 0.
     _c_1 = e * math.pow_(th, 3.5) / 10.
     _c_2 = 1. - th
-    for i, f_i in enumerate(lines.water_vapor.keys()):
-        b = lines.water_vapor[f_i]
+    # суммирование по линиям: поля дополняются последней осью, по которой расположены линии
+    _p, _e, _th, _c_1, _c_2 = (np.asarray(x)[..., None] for x in (p, e, th, _c_1, _c_2))
+    for lo, hi in __line_chunks(len(lines.water_vapor_frequencies), f, t, p, rho):
+        b = lines.water_vapor_parameters[:, lo:hi].astype(th.dtype)
+        f_i = lines.water_vapor_frequencies[lo:hi]
+        ratio, minus, plus = __line_shapes(f, f_i, th.dtype)
         S_i = b[1] * _c_1 * math.exp(b[2] * _c_2)
-        df_i = b[3] / 10000 * (p * math.pow_(th, b[4]) + b[5] * e * math.pow_(th, b[6]))
+        df_i = b[3] / 10000 * (_p * math.pow_(_th, b[4]) + b[5] * _e * math.pow_(_th, b[6]))
         df_i = 0.535 * df_i + math.sqrt(
-            0.217 * df_i * df_i + (2.1316 / 1000000000000 * f_i * f_i) / th
+            0.217 * df_i * df_i + (2.1316 / 1000000000000 * f_i * f_i).astype(th.dtype) / _th
         )
-        F_i = f / f_i * (
-                df_i / ((f_i - f) * (f_i - f) + df_i * df_i) +
-                df_i / ((f_i + f) * (f_i + f) + df_i * df_i)
+        F_i = ratio * (
+                df_i / (minus * minus + df_i * df_i) +
+                df_i / (plus * plus + df_i * df_i)
         )
-        N = N + S_i * F_i
+        N = N + np.sum(S_i * F_i, axis=-1)
     return N
 
 
-def gamma_water_vapor(frequency: float,
+def gamma_water_vapor(frequency: Union[float, TensorLike],
                       T: Union[float, TensorLike], P: Union[float, TensorLike],
                       rho: Union[float, TensorLike]) -> Union[float, TensorLike]:
     """
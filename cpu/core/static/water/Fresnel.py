@@ -1,5 +1,5 @@
 #  -*- coding: utf-8 -*-
-from typing import Union
+from typing import Union, Tuple
 from cpu.core.types import Number, Tensor2D
 from cpu.core.const import *
 import cpu.core.math as math
@@ -12,63 +12,98 @@ import cpu.core.static.water.dielectric as dielectric
 
 
 def M_horizontal(frequency: float, psi: float, T: Union[float, Tensor2D],
-                 Sw: Union[float, Tensor2D] = 0.) -> Union[Number, Tensor2D]:
+                 Sw: Union[float, Tensor2D] = 0.,
+                 epsilon: Union[complex, Tensor2D] = None) -> Union[Number, Tensor2D]:
     """
 
     :param frequency: частота излучения в ГГц
     :param psi: угол скольжения, рад.
     :param T: температура поверхности, град. Цельс.
     :param Sw: соленость, промили
+    :param epsilon: заранее рассчитанная комплексная диэлектрическая проницаемость (тогда frequency, T и Sw не используются)
     """
-    epsilon = dielectric.epsilon_complex(frequency, T, Sw)
+    if epsilon is None:
+        epsilon = dielectric.epsilon_complex(frequency, T, Sw)
     cos = math.sqrt(epsilon - math.complex_(math.cos(psi) * math.cos(psi)))
     return (math.complex_(math.sin(psi)) - cos) / (math.complex_(math.sin(psi)) + cos)
 
 
 def M_vertical(frequency: float, psi: float, T: Union[float, Tensor2D],
-               Sw: Union[float, Tensor2D] = 0.) -> Union[Number, Tensor2D]:
-    epsilon = dielectric.epsilon_complex(frequency, T, Sw)
+               Sw: Union[float, Tensor2D] = 0.,
+               epsilon: Union[complex, Tensor2D] = None) -> Union[Number, Tensor2D]:
+    if epsilon is None:
+        epsilon = dielectric.epsilon_complex(frequency, T, Sw)
     cos = math.sqrt(epsilon - math.complex_(real=math.cos(psi) * math.cos(psi)))
     return (epsilon * math.complex_(math.sin(psi)) - cos) / \
            (epsilon * math.complex_(math.sin(psi)) + cos)
 
 
 def R_horizontal(frequency: float, theta: float, T: Union[float, Tensor2D],
-                 Sw: Union[float, Tensor2D] = 0.) -> Union[float, Tensor2D]:
+                 Sw: Union[float, Tensor2D] = 0.,
+                 epsilon: Union[complex, Tensor2D] = None) -> Union[float, Tensor2D]:
     """
     :param frequency: частота излучения в ГГц
     :param theta: зенитный угол, рад.
     :param T: температура поверхности, град. Цельс.
     :param Sw: соленость, промили
+    :param epsilon: заранее рассчитанная комплексная диэлектрическая проницаемость
     :return: коэффициент отражения на горизонтальной поляризации
     """
-    M_h = M_horizontal(frequency, PI / 2. - theta, T, Sw)
+    M_h = M_horizontal(frequency, PI / 2. - theta, T, Sw, epsilon)
     val = math.abs_(M_h)
     return val * val
 
 
 def R_vertical(frequency: float, theta: float, T: Union[float, Tensor2D],
-               Sw: Union[float, Tensor2D] = 0.) -> Union[float, Tensor2D]:
+               Sw: Union[float, Tensor2D] = 0.,
+               epsilon: Union[complex, Tensor2D] = None) -> Union[float, Tensor2D]:
     """
     :param frequency: частота излучения в ГГц
     :param theta: зенитный угол, рад.
     :param T: температура поверхности, град. Цельс.
     :param Sw: соленость, промили
+    :param epsilon: заранее рассчитанная комплексная диэлектрическая проницаемость
     :return: коэффициент отражения на вертикальной поляризации
     """
-    M_v = M_vertical(frequency, PI / 2. - theta, T, Sw)
+    M_v = M_vertical(frequency, PI / 2. - theta, T, Sw, epsilon)
     val = math.abs_(M_v)
     return val * val
 
 
 def R(frequency: float, T: Union[float, Tensor2D],
-      Sw: Union[float, Tensor2D] = 0.) -> Union[float, Tensor2D]:
+      Sw: Union[float, Tensor2D] = 0., epsilon: Union[complex, Tensor2D] = None) -> Union[float, Tensor2D]:
     """
     :param frequency: частота излучения в ГГц
     :param T: температура поверхности, град. Цельс.
     :param Sw: соленость, промили
+    :param epsilon: заранее рассчитанная комплексная диэлектрическая проницаемость
     :return: коэффициент отражения при зенитном угле 0 рад
     """
-    epsilon = dielectric.epsilon_complex(frequency, T, Sw)
+    if epsilon is None:
+        epsilon = dielectric.epsilon_complex(frequency, T, Sw)
     val = math.abs_((math.sqrt(epsilon) - 1) / (math.sqrt(epsilon) + 1))
     return val * val
+
+
+def R_polarized(frequency: float, theta: Union[float, Tensor2D], T: Union[float, Tensor2D],
+                Sw: Union[float, Tensor2D] = 0.,
+                epsilon: Union[complex, Tensor2D] = None) -> Tuple[Union[float, Tensor2D], Union[float, Tensor2D]]:
+    """
+    Коэффициенты отражения на обеих поляризациях. Диэлектрическая проницаемость и общий для H и V
+    радикал рассчитываются один раз; аргументы должны быть согласованы по правилам broadcasting
+
+    :param frequency: частота излучения в ГГц
+    :param theta: зенитный угол, рад.
+    :param T: температура поверхности, град. Цельс.
+    :param Sw: соленость, промили
+    :param epsilon: заранее рассчитанная комплексная диэлектрическая проницаемость
+    :return: кортеж (горизонтальная поляризация, вертикальная поляризация)
+    """
+    if epsilon is None:
+        epsilon = dielectric.epsilon_complex(frequency, T, Sw)
+    psi = PI / 2. - theta   # угол скольжения
+    sin, cos = math.complex_(math.sin(psi)), math.cos(psi)
+    root = math.sqrt(epsilon - math.complex_(cos * cos))
+    M_h = math.abs_((sin - root) / (sin + root))
+    M_v = math.abs_((epsilon * sin - root) / (epsilon * sin + root))
+    return M_h * M_h, M_v * M_v
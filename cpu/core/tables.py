@@ -0,0 +1,157 @@
+#  -*- coding: utf-8 -*-
+from typing import Union, List, Tuple, Dict
+import os
+from cpu.core.types import TensorLike, cpu_float
+import cpu.core.static.p676 as p676
+import numpy as np
+
+
+"""
+Таблицы погонных коэффициентов поглощения
+"""
+
+
+class AbsorptionTable:
+    def __init__(self, frequencies: Union[np.ndarray, List[float]],
+                 T: Tuple[float, float, int] = (-90., 40., 66),
+                 P: Tuple[float, float, int] = (1., 1100., 61),
+                 rho: Tuple[float, float, int] = (0., 30., 31),
+                 verbose: bool = False):
+        """
+        Таблица погонных коэффициентов поглощения в кислороде и водяном паре, рассчитанных по точным
+        формулам Rec.ITU-R P.676 (p676.gamma_oxygen, p676.gamma_water_vapor) для фиксированного набора частот
+        на равномерной сетке по температуре, логарифму давления и абсолютной влажности.
+        Значения между узлами находятся трилинейной интерполяцией, за пределами сетки - линейной экстраполяцией
+
+        :param frequencies: частоты в ГГц
+        :param T: (мин., макс., число узлов) по термодинамической температуре, град. Цельс.
+        :param P: (мин., макс., число узлов) по атмосферному давлению, гПа (сетка равномерна по log P)
+        :param rho: (мин., макс., число узлов) по абсолютной влажности, г/м^3
+        :param verbose: вывод доп. информации
+        """
+        self.frequencies = np.asarray(frequencies, dtype=float)
+        self.T = np.linspace(*T)
+        self.logP = np.linspace(np.log(P[0]), np.log(P[1]), P[2])
+        self.rho = np.linspace(*rho)
+        self._path = None
+
+        t, p, r = np.meshgrid(self.T, np.exp(self.logP), self.rho, indexing='ij')
+        self.values = np.zeros((2, len(self.frequencies), len(self.T), len(self.logP), len(self.rho)),
+                               dtype=cpu_float)
+        for k, f in enumerate(self.frequencies):
+            if verbose:
+                print('\r{:.2f}%'.format((k + 1) / len(self.frequencies) * 100), end='', flush=True)
+            self.values[0, k] = p676.gamma_oxygen(f, t, p, r)
+            self.values[1, k] = p676.gamma_water_vapor(f, t, p, r)
+        if verbose:
+            print()
+        self.max_error = self.errors()
+
+    def __index(self, frequency: Union[float, TensorLike]) -> Union[int, np.ndarray]:
+        f = np.asarray(frequency, dtype=float)
+        k = np.argmin(np.abs(f[..., None] - self.frequencies), axis=-1)
+        if not np.allclose(self.frequencies[k], f, rtol=1e-5, atol=0.):
+            raise ValueError('частота отсутствует в таблице')
+        return k
+
+    @staticmethod
+    def __cell(axis: np.ndarray, x: Union[float, TensorLike]) -> Tuple[np.ndarray, np.ndarray]:
+        x = (np.asarray(x) - axis[0]) / (axis[1] - axis[0])
+        i = np.clip(np.floor(x), 0, len(axis) - 2).astype(int)
+        return i, (x - i).astype(cpu_float)
+
+    def __interpolate(self, n: int, frequency: Union[float, TensorLike], T: Union[float, TensorLike],
+                      P: Union[float, TensorLike], rho: Union[float, TensorLike]) -> Union[float, TensorLike]:
+        k = self.__index(frequency)
+        (i, wi), (j, wj), (l, wl) = self.__cell(self.T, T), self.__cell(self.logP, np.log(P)), \
+            self.__cell(self.rho, rho)
+        v = self.values[n]
+        out = 0.
+        for di, ci in [(0, 1 - wi), (1, wi)]:
+            for dj, cj in [(0, 1 - wj), (1, wj)]:
+                for dl, cl in [(0, 1 - wl), (1, wl)]:
+                    out = out + v[k, i + di, j + dj, l + dl] * (ci * cj * cl)
+        return out
+
+    def oxygen(self, frequency: Union[float, TensorLike], T: Union[float, TensorLike],
+               P: Union[float, TensorLike], rho: Union[float, TensorLike]) -> Union[float, TensorLike]:
+        """
+        :param frequency: частота излучения в ГГц (из набора частот таблицы; число или массив,
+            согласованный по форме с T, P, rho)
+        :param T: термодинамическая температура, градусы Цельсия
+        :param P: атмосферное давление, гПа
+        :param rho: абсолютная влажность, г/м^3
+        :return: погонный коэффициент поглощения в кислороде (Дб/км)
+        """
+        return self.__interpolate(0, frequency, T, P, rho)
+
+    def water_vapor(self, frequency: Union[float, TensorLike], T: Union[float, TensorLike],
+                    P: Union[float, TensorLike], rho: Union[float, TensorLike]) -> Union[float, TensorLike]:
+        """
+        :param frequency: частота излучения в ГГц (из набора частот таблицы; число или массив,
+            согласованный по форме с T, P, rho)
+        :param T: термодинамическая температура, градусы Цельсия
+        :param P: атмосферное давление, гПа
+        :param rho: абсолютная влажность, г/м^3
+        :return: погонный коэффициент поглощения в водяном паре (Дб/км)
+        """
+        return self.__interpolate(1, frequency, T, P, rho)
+
+    def errors(self, n: int = 10000, seed: int = 42) -> Dict[str, float]:
+        """
+        Оценка погрешности интерполяции по сравнению с точной моделью P.676
+        в n случайных точках внутри сетки
+
+        :return: максимальная абсолютная погрешность (Дб/км) для кислорода и водяного пара
+        """
+        rs = np.random.RandomState(seed)
+        t = rs.uniform(self.T[0], self.T[-1], n)
+        p = np.exp(rs.uniform(self.logP[0], self.logP[-1], n))
+        r = rs.uniform(self.rho[0], self.rho[-1], n)
+        err = {'oxygen': 0., 'water_vapor': 0.}
+        for f in self.frequencies:
+            err['oxygen'] = max(err['oxygen'], float(np.max(np.abs(
+                self.oxygen(f, t, p, r) - p676.gamma_oxygen(f, t, p, r)))))
+            err['water_vapor'] = max(err['water_vapor'], float(np.max(np.abs(
+                self.water_vapor(f, t, p, r) - p676.gamma_water_vapor(f, t, p, r)))))
+        return err
+
+    def save(self, path: str) -> None:
+        """
+        Сохранить таблицу в каталог path: значения - в values.npy (доступен для memmap),
+        сетки и оценки погрешности - в grid.npz
+        """
+        if not os.path.exists(path):
+            os.makedirs(path)
+        np.save(os.path.join(path, 'values.npy'), self.values)
+        np.savez(os.path.join(path, 'grid.npz'), frequencies=self.frequencies,
+                 T=self.T, logP=self.logP, rho=self.rho,
+                 max_error=[self.max_error['oxygen'], self.max_error['water_vapor']])
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> 'AbsorptionTable':
+        """
+        Загрузить таблицу, сохраненную методом save
+
+        :param path: каталог с таблицей
+        :param mmap: отображать значения в память (numpy.memmap) без чтения в каждый процесс
+        """
+        table = cls.__new__(cls)
+        grid = np.load(os.path.join(path, 'grid.npz'))
+        table.frequencies, table.T, table.logP, table.rho = grid['frequencies'], grid['T'], grid['logP'], grid['rho']
+        table.max_error = {'oxygen': float(grid['max_error'][0]), 'water_vapor': float(grid['max_error'][1])}
+        table.values = np.load(os.path.join(path, 'values.npy'), mmap_mode='r' if mmap else None)
+        table._path = path if mmap else None
+        return table
+
+    def __getstate__(self):
+        # таблица, отображенная в память, передается в другие процессы по имени каталога
+        if self._path is not None:
+            return {'_path': self._path}
+        return self.__dict__
+
+    def __setstate__(self, state):
+        if '_path' in state and len(state) == 1:
+            self.__dict__.update(AbsorptionTable.load(state['_path']).__dict__)
+        else:
+            self.__dict__.update(state)
@@ -267,16 +267,11 @@ def ex4():
         np.asarray([h]), const_w=False, _w=lambda _H: _c0 * np.power(_H, _c1)
     )
 
-    brts = {}
     _THETA = np.linspace(0, 51, 20)
-    for nu in frequencies:
-        brts[nu] = []
-        for THETA in _THETA:
-            angle = THETA * np.pi / 180.  # зенитный угол наблюдения, по умолчанию: 0
-            surface.angle = angle
-            brt = satellite.brightness_temperature(nu, solid, surface, cosmic=True, __theta=angle)[0]
-            brts[nu].append(brt)
-        brts[nu] = np.asarray(brts[nu])
+    # все углы за один вызов: результат [столбцы, углы, частоты]
+    brt = satellite.brightness_temperature(frequencies, solid, surface, cosmic=True,
+                                           angles=_THETA * np.pi / 180.)[0]
+    brts = {nu: brt[:, :, k].T for k, nu in enumerate(frequencies)}
 
     import dill
     with open('flat_tb_36GHz_theta_noapprox_polarization{}.data'.format(polarization), 'wb') as dump:
@@ -0,0 +1,390 @@
+#  -*- coding: utf-8 -*-
+from typing import Union, List, Tuple, Dict
+from itertools import combinations
+import os
+import json
+import hashlib
+import tempfile
+import time
+from cpu.core.types import TensorLike
+import cpu.core.math as math
+from cpu.atmosphere import Atmosphere, avg
+from cpu.surface import Surface, SmoothWaterSurface
+from cpu.weight_funcs import krho
+import cpu.satellite as satellite
+from cpu.core.static.weight_funcs import kw
+import numpy as np
+
+
+"""
+Восстановление параметров атмосферы по яркостным температурам: двухчастотный метод (Q, W)
+и оптимальное оценивание профилей T, rho, w
+"""
+
+
+class Coefficients:
+    # массивы, из которых состоит объект (см. save, load)
+    fields = ('frequencies', 'pairs', 'theta', 'krho', 'kw', 'tau_o', 'T_avg_down', 'T_avg_up', 'A', 'B', 'M', 'M_inv')
+
+    def __init__(self, sa: Atmosphere, surface: Surface,
+                 frequencies: Union[np.ndarray, List[float]],
+                 pairs: List[Tuple[float, float]] = None,
+                 theta: float = 0., T_cosmic: float = 2.72548, t_clouds: float = 0.):
+        """
+        Коэффициенты двухчастотного метода, рассчитанные по опорной (стандартной) атмосфере
+        одновременно для всех частот
+
+        :param sa: опорная атмосфера (объект Atmosphere)
+        :param surface: модель подстилающей поверхности (угол наблюдения задается самой моделью - surface.angle)
+        :param frequencies: частоты каналов в ГГц
+        :param pairs: пары частот (nu1, nu2), по которым выполняется восстановление.
+            По умолчанию - все пары каналов
+        :param theta: зенитный угол наблюдения, рад.
+        :param T_cosmic: яркостная температура реликтового фона, К
+        :param t_clouds: эффективная температура облаков для весовой функции k_w, град. Цельс.
+        """
+        self.frequencies = np.asarray(frequencies, dtype=float)
+        if pairs is None:
+            pairs = list(combinations(self.frequencies, 2))
+        self.pairs = np.asarray([[self.__index(nu) for nu in pair] for pair in pairs], dtype=int).reshape(-1, 2)
+        self.theta = theta
+
+        f = self.frequencies
+        self.krho = np.asarray(krho(sa, f), dtype=float)
+        self.kw = np.asarray(kw(f, t=t_clouds), dtype=float)
+        self.tau_o = np.asarray(sa.opacity.oxygen(f), dtype=float)
+        self.T_avg_down = np.asarray(avg.downward.T(sa, f, theta), dtype=float)
+        self.T_avg_up = np.asarray(avg.upward.T(sa, f, theta), dtype=float)
+        R = np.asarray(surface.reflectivity(f), dtype=float)
+        self.A = (self.T_avg_down - T_cosmic) * R
+        self.B = self.T_avg_up - self.T_avg_down * R - (np.asarray(surface.temperature, dtype=float) + 273.15) * (1 - R)
+
+        # M[k] - матрица системы для k-й пары: строки - частоты, столбцы - (krho, kw)
+        self.M = np.stack([self.krho[self.pairs], self.kw[self.pairs]], axis=-1)
+        det = self.M[:, 0, 0] * self.M[:, 1, 1] - self.M[:, 0, 1] * self.M[:, 1, 0]
+        self.M_inv = np.stack([np.stack([self.M[:, 1, 1], -self.M[:, 0, 1]], axis=-1),
+                               np.stack([-self.M[:, 1, 0], self.M[:, 0, 0]], axis=-1)], axis=-2) / det[:, None, None]
+
+    def __index(self, frequency: float) -> int:
+        k = int(np.argmin(np.abs(self.frequencies - frequency)))
+        if not np.isclose(self.frequencies[k], frequency, rtol=1e-5, atol=0.):
+            raise ValueError('частота отсутствует в списке каналов')
+        return k
+
+    def __stack(self, brightness_temperature: Union[TensorLike, Dict[float, TensorLike]]) -> np.ndarray:
+        if isinstance(brightness_temperature, dict):
+            brightness_temperature = [brightness_temperature[nu] for nu in self.frequencies.tolist()]
+        tb = np.asarray(brightness_temperature, dtype=float)
+        assert len(tb) == len(self.frequencies), 'число карт не совпадает с числом каналов'
+        return tb
+
+    def opacity(self, brightness_temperature: Union[TensorLike, Dict[float, TensorLike]]) -> np.ndarray:
+        """
+        Полное поглощение в зените, восстановленное по яркостной температуре в каждом канале
+
+        :param brightness_temperature: яркостные температуры - массив [частоты, ...] или словарь {частота: карта}
+        :return: массив [частоты, ...]
+        """
+        tb = self.__stack(brightness_temperature)
+        shape = [-1] + [1] * (tb.ndim - 1)
+        a, b = self.A.reshape(shape), self.B.reshape(shape)
+        D = b * b - 4 * a * (tb - self.T_avg_up.reshape(shape))
+        return -np.log((-b + np.sqrt(D)) / (2 * a)) * np.cos(self.theta)
+
+    def retrieve(self, brightness_temperature: Union[TensorLike, Dict[float, TensorLike]]) -> \
+            Tuple[np.ndarray, np.ndarray]:
+        """
+        Восстановление Q и W сразу для всех пар частот
+
+        :param brightness_temperature: яркостные температуры - массив [частоты, ...] или словарь {частота: карта}
+        :return: Q и W (в тех же единицах, что Atmosphere.Q и Atmosphere.W) - массивы [пары, ...]
+            в порядке self.pairs
+        """
+        tau = self.opacity(brightness_temperature)
+        tau = tau - self.tau_o.reshape([-1] + [1] * (tau.ndim - 1))
+        r1, r2 = tau[self.pairs[:, 0]], tau[self.pairs[:, 1]]
+        m = self.M_inv.reshape(self.M_inv.shape + (1, ) * (tau.ndim - 1))
+        return m[:, 0, 0] * r1 + m[:, 0, 1] * r2, m[:, 1, 0] * r1 + m[:, 1, 1] * r2
+
+
+def save(path: str, coefficients: List[Coefficients]) -> None:
+    """
+    Сохранить набор коэффициентов (например, для нескольких углов наблюдения) в один файл .npz.
+    Запись атомарна: параллельно работающие процессы не увидят недописанный файл
+
+    :param path: имя файла
+    :param coefficients: список объектов Coefficients с одинаковыми частотами и парами
+    """
+    folder = os.path.dirname(os.path.abspath(path))
+    if not os.path.exists(folder):
+        os.makedirs(folder, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(suffix='.npz', dir=folder)
+    with os.fdopen(fd, 'wb') as file:
+        np.savez(file, **{name: np.stack([np.asarray(getattr(c, name)) for c in coefficients])
+                          for name in Coefficients.fields})
+    os.replace(tmp, path)
+
+
+def load(path: str) -> List[Coefficients]:
+    """
+    Загрузить набор коэффициентов, сохраненный функцией save
+    """
+    with np.load(path) as data:
+        arrays = {name: data[name] for name in Coefficients.fields}
+    out = []
+    for k in range(len(arrays['theta'])):
+        c = Coefficients.__new__(Coefficients)
+        for name in Coefficients.fields:
+            setattr(c, name, arrays[name][k])
+        c.theta = float(c.theta)
+        out.append(c)
+    return out
+
+
+def cached(frequencies: Union[np.ndarray, List[float]],
+           pairs: List[Tuple[float, float]] = None,
+           thetas: Union[np.ndarray, List[float]] = (0., ),
+           T0: float = 15., P0: float = 1013, rho0: float = 7.5, H: float = 10, dh: float = 10. / 500,
+           surface_temperature: float = 15., salinity: float = 0., polarization: str = None,
+           integration_method: str = 'trapz', approx: bool = True,
+           T_cosmic: float = 2.72548, t_clouds: float = 0.,
+           folder: str = 'coefficients', verbose: bool = False) -> List[Coefficients]:
+    """
+    Коэффициенты двухчастотного метода для стандартной атмосферы (Atmosphere.Standard) над гладкой водной
+    поверхностью для набора углов наблюдения. Результат сохраняется в каталог folder под именем,
+    однозначно определяемым всеми параметрами, и при повторных вызовах (в т.ч. из других процессов)
+    загружается с диска без пересчета
+
+    :param frequencies: частоты каналов в ГГц
+    :param pairs: пары частот. По умолчанию - все пары каналов
+    :param thetas: зенитные углы наблюдения, рад.
+    :param T0: приповерхностная температура, град. Цельс.
+    :param P0: давление на уровне поверхности, гПа
+    :param rho0: приповерхностное значение абсолютной влажности, г/м^3
+    :param H: высота расчетной области, км
+    :param dh: шаг по высоте, км
+    :param surface_temperature: термодинамическая температура поверхности, град. Цельс.
+    :param salinity: соленость, промили
+    :param polarization: поляризация ('H' или 'V')
+    :param integration_method: метод интегрирования
+    :param approx: вычисление коэффициентов затухания по приближенным формулам
+    :param T_cosmic: яркостная температура реликтового фона, К
+    :param t_clouds: эффективная температура облаков для весовой функции k_w, град. Цельс.
+    :param folder: каталог для хранения коэффициентов
+    :param verbose: вывод доп. информации
+    :return: список объектов Coefficients в порядке thetas
+    """
+    frequencies = [float(nu) for nu in frequencies]
+    thetas = [float(theta) for theta in thetas]
+    if pairs is not None:
+        pairs = [[float(nu) for nu in pair] for pair in pairs]
+    key = dict(frequencies=frequencies, pairs=pairs, thetas=thetas,
+               T0=float(T0), P0=float(P0), rho0=float(rho0), H=float(H), dh=float(dh),
+               surface_temperature=float(surface_temperature), salinity=float(salinity),
+               polarization=polarization, integration_method=integration_method, approx=bool(approx),
+               T_cosmic=float(T_cosmic), t_clouds=float(t_clouds))
+    name = hashlib.sha1(json.dumps(key, sort_keys=True).encode()).hexdigest()[:16]
+    path = os.path.join(folder, 'coefficients_{}.npz'.format(name))
+    if os.path.exists(path):
+        return load(path)
+
+    sa = Atmosphere.Standard(T0, P0, rho0, H=H, dh=dh)
+    sa.integration_method = integration_method
+    sa.approx = approx
+    out = []
+    for k, theta in enumerate(thetas):
+        if verbose:
+            print('\r{:.2f}%'.format((k + 1) / len(thetas) * 100), end='', flush=True)
+        surface = SmoothWaterSurface(surface_temperature, salinity, theta, polarization)
+        out.append(Coefficients(sa, surface, frequencies, pairs, theta, T_cosmic, t_clouds))
+    if verbose:
+        print()
+    save(path, out)
+    return out
+
+
+class Prior:
+    def __init__(self, mean: Dict[str, np.ndarray], covariance: np.ndarray,
+                 variables: Union[Tuple[str, ...], List[str]] = ('T', 'rho', 'w')):
+        """
+        Априорная информация для оптимального оценивания (см. optimal_estimation)
+
+        :param mean: средние профили {'T': ..., 'rho': ..., 'w': ...} (град. Цельс., г/м^3, кг/м^3).
+            Профили переменных, не входящих в variables, остаются неизменными
+        :param covariance: ковариационная матрица вектора состояния - профилей variables, записанных подряд
+        :param variables: восстанавливаемые переменные
+        """
+        self.mean = {name: np.asarray(a, dtype=float) for name, a in mean.items()}
+        self.variables = tuple(variables)
+        self.covariance = np.asarray(covariance, dtype=float)
+        n = sum(len(self.mean[name]) for name in self.variables)
+        assert self.covariance.shape == (n, n), 'размер ковариационной матрицы не совпадает с вектором состояния'
+
+    @property
+    def state(self) -> np.ndarray:
+        """
+        :return: средний вектор состояния
+        """
+        return np.concatenate([self.mean[name] for name in self.variables])
+
+    @classmethod
+    def standard(cls, atm: Atmosphere,
+                 std: Dict[str, float] = None, length: float = 1.5,
+                 variables: Union[Tuple[str, ...], List[str]] = ('T', 'rho', 'w')) -> 'Prior':
+        """
+        Априорная информация по опорной атмосфере (например, Atmosphere.Standard): средние профили -
+        профили atm, ковариации - экспоненциально убывающие с расстоянием по высоте
+
+        :param atm: опорная атмосфера с 1D-профилями
+        :param std: СКО каждой переменной. По умолчанию: T - 3 град., rho - 1.5 г/м^3,
+            w - 0.1 (в единицах Atmosphere.liquid_water)
+        :param length: радиус корреляции по высоте, км
+        :param variables: восстанавливаемые переменные
+        """
+        sigma = {'T': 3., 'rho': 1.5, 'w': 0.1}
+        if std is not None:
+            sigma.update(std)
+        w = atm.liquid_water if math.rank(atm.liquid_water) == 1 else np.zeros_like(atm.temperature)
+        mean = {'T': atm.temperature, 'rho': atm.absolute_humidity, 'w': w}
+        z = np.asarray(atm.altitudes, dtype=float)
+        correlation = np.exp(-np.abs(z[:, None] - z[None, :]) / length)
+        blocks = [sigma[name] ** 2 * correlation for name in variables]
+        covariance = np.zeros((len(z) * len(blocks), len(z) * len(blocks)))
+        for k, block in enumerate(blocks):
+            covariance[k * len(z):(k + 1) * len(z), k * len(z):(k + 1) * len(z)] = block
+        return cls(mean, covariance, variables)
+
+    @classmethod
+    def ensemble(cls, T: np.ndarray, rho: np.ndarray, w: np.ndarray = None,
+                 variables: Union[Tuple[str, ...], List[str]] = ('T', 'rho'),
+                 regularization: float = 1e-3) -> 'Prior':
+        """
+        Априорная информация по ансамблю профилей (например, по данным радиозондирования):
+        выборочные средние и ковариации
+
+        :param T: профили температуры [M, N], град. Цельс.
+        :param rho: профили абсолютной влажности [M, N], г/м^3
+        :param w: профили водности [M, N], кг/м^3. Может быть не указан, если 'w' не входит в variables
+        :param variables: восстанавливаемые переменные
+        :param regularization: добавка к диагонали ковариационной матрицы (в долях средней дисперсии
+            каждой переменной) для ее обращения при малом объеме выборки
+        """
+        profiles = {'T': np.asarray(T, dtype=float), 'rho': np.asarray(rho, dtype=float)}
+        profiles['w'] = np.zeros_like(profiles['T']) if w is None else np.asarray(w, dtype=float)
+        if 'w' in variables and w is None:
+            raise ValueError('для восстановления водности необходим ансамбль профилей w')
+        mean = {name: np.mean(a, axis=0) for name, a in profiles.items()}
+        x = np.concatenate([profiles[name] for name in variables], axis=1)
+        covariance = np.atleast_2d(np.cov(x, rowvar=False))
+        n = profiles['T'].shape[1]
+        for k in range(len(variables)):
+            block = slice(k * n, (k + 1) * n)
+            covariance[block, block] += regularization * np.mean(np.diag(covariance)[block]) * np.eye(n)
+        return cls(mean, covariance, variables)
+
+
+def optimal_estimation(brightness_temperature: np.ndarray,
+                       frequencies: Union[np.ndarray, List[float]],
+                       atm: Atmosphere, srf: Surface, prior: Prior,
+                       noise: Union[float, np.ndarray] = 0.5,
+                       first_guess: np.ndarray = None,
+                       __theta: float = None, cosmic: bool = True,
+                       max_iter: int = 20, tol: float = 1e-2, gamma: float = 1.,
+                       verbose: bool = False) -> Dict[str, np.ndarray]:
+    """
+    Восстановление профилей T, rho, w методом оптимального оценивания (итерации Левенберга-Марквардта)
+    одновременно для множества столбцов. Прямая модель и ее якобиан - satellite.jacobian; на каждой итерации
+    рассчитываются только столбцы, для которых итерации еще не сошлись
+
+    :param brightness_temperature: измеренные яркостные температуры [..., F]
+    :param frequencies: частоты каналов в ГГц
+    :param atm: атмосфера с 1D-профилями, задающая высотную сетку, давление и параметры расчета
+    :param srf: объект Surface (поверхность)
+    :param prior: априорная информация (см. Prior)
+    :param noise: СКО шума измерений (число или для каждого канала), К
+    :param first_guess: начальное приближение [..., n] (вектор состояния). По умолчанию - prior.state
+    :param __theta: угол наблюдения в радианах (deprecated)
+    :param cosmic: учитывать реликтовый фон
+    :param max_iter: макс. число итераций
+    :param tol: порог сходимости - среднеквадратичный шаг в долях априорного СКО
+    :param gamma: начальное значение параметра Левенберга-Марквардта (0 - метод Гаусса-Ньютона)
+    :param verbose: вывод доп. информации
+    :return: словарь: восстановленные профили по variables ([..., N]), 'brightness_temperature' - рассчитанные
+        по ним яркостные температуры, 'cost' - значение функции стоимости, 'converged', 'iterations',
+        'time' - время (с) от начала расчета до завершения итераций для каждого столбца
+    """
+    start = time.time()
+    frequencies = np.atleast_1d(np.asarray(frequencies, dtype=float))
+    tb = np.asarray(brightness_temperature, dtype=float)
+    shape = tb.shape[:-1]
+    y = tb.reshape(-1, len(frequencies))
+    C = len(y)
+    assert max(math.rank(a) for a in [atm.temperature, atm.pressure, atm.absolute_humidity]) == 1, \
+        'атмосфера должна быть задана 1D-профилями'
+
+    xa = prior.state
+    n, N = len(xa), len(atm.altitudes)
+    Sa, Sa_inv = prior.covariance, np.linalg.inv(prior.covariance)
+    se2 = np.broadcast_to(np.asarray(noise, dtype=float) ** 2, (len(frequencies), ))
+    sigma = np.sqrt(np.diag(Sa))
+    positive = np.concatenate([np.full(N, name != 'T') for name in prior.variables])
+
+    def forward(x: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        fields = {name: np.broadcast_to(prior.mean[name], (len(x), N)) for name in ['T', 'rho', 'w']}
+        for k, name in enumerate(prior.variables):
+            fields[name] = x[:, k * N:(k + 1) * N]
+        a = atm._replace(*[math.as_tensor(fields['T'])[:, None, :], atm.pressure,
+                           math.as_tensor(fields['rho'])[:, None, :], math.as_tensor(fields['w'])[:, None, :]])
+        J = satellite.jacobian(frequencies, a, srf, __theta, cosmic)
+        K = np.concatenate([J[name][:, 0] for name in prior.variables], axis=-1)
+        return np.asarray(J['brightness_temperature'][:, 0], dtype=float), np.asarray(K, dtype=float)
+
+    def cost(x: np.ndarray, Fx: np.ndarray, y_: np.ndarray) -> np.ndarray:
+        d = x - xa
+        return np.sum((y_ - Fx) ** 2 / se2, axis=-1) + np.einsum('cn,nm,cm->c', d, Sa_inv, d)
+
+    x = np.broadcast_to(xa if first_guess is None else np.asarray(first_guess, dtype=float).reshape(-1, n),
+                        (C, n)).copy()
+    Fx, K = forward(x)
+    J = cost(x, Fx, y)
+    g = np.full(C, float(gamma))
+    iterations = np.zeros(C, dtype=int)
+    converged = np.zeros(C, dtype=bool)
+    elapsed = np.zeros(C)
+
+    active = np.arange(C)
+    for it in range(max_iter):
+        if not len(active):
+            break
+        xi, Fi, Ki, yi, gi = x[active], Fx[active], K[active], y[active], g[active]
+        # шаг Левенберга-Марквардта в пространстве измерений (размер системы - число каналов)
+        grad = np.einsum('cfn,cf->cn', Ki, (yi - Fi) / se2) - (xi - xa) @ Sa_inv
+        u = grad @ Sa / (1. + gi[:, None])
+        SK = np.einsum('nm,cfm->cnf', Sa, Ki) / (1. + gi[:, None, None])
+        M = np.einsum('cfn,cnk->cfk', Ki, SK) + np.diag(se2)
+        step = u - np.einsum('cnf,cf->cn', SK, np.linalg.solve(M, np.einsum('cfn,cn->cf', Ki, u)[..., None])[..., 0])
+        xt = xi + step
+        xt[:, positive] = np.maximum(xt[:, positive], 0.)
+
+        Ft, Kt = forward(xt)
+        Jt = cost(xt, Ft, yi)
+        accept = Jt <= J[active]
+        idx = active[accept]
+        x[idx], Fx[idx], K[idx], J[idx] = xt[accept], Ft[accept], Kt[accept], Jt[accept]
+        g[active] = np.where(accept, g[active] / 10., g[active] * 10.)
+        iterations[active] += 1
+
+        done = accept & (np.sqrt(np.mean(((xt - xi) / sigma) ** 2, axis=-1)) < tol)
+        converged[active[done]] = True
+        elapsed[active] = time.time() - start
+        active = active[~done]
+        if verbose:
+            print('\rитерация {}: осталось столбцов {} из {}'.format(it + 1, len(active), C), end='', flush=True)
+    if verbose:
+        print()
+
+    out = {name: x[:, k * N:(k + 1) * N].reshape(shape + (N, )) for k, name in enumerate(prior.variables)}
+    out.update({'brightness_temperature': Fx.reshape(shape + (len(frequencies), )), 'cost': J.reshape(shape),
+                'converged': converged.reshape(shape), 'iterations': iterations.reshape(shape),
+                'time': elapsed.reshape(shape)})
+    return out
@@ -1,10 +1,12 @@
 # -*- coding: utf-8 -*-
-from typing import Union, List
-from cpu.core.types import Tensor2D
+from typing import Union, List, Tuple, Dict
+import copy
+from cpu.core.types import Tensor2D, Tensor1D_or_3D
 import cpu.core.math as math
 from cpu.atmosphere import Atmosphere
 from cpu.surface import Surface
 from cpu.core.multi import parallel
+from cpu.core.profiling import profiled
 import numpy as np
 
 """
@@ -12,20 +14,34 @@ import numpy as np
 """
 
 
-def brightness_temperature(frequency: float,
+@profiled('satellite.brightness_temperature', 0)
+def brightness_temperature(frequency: Union[float, np.ndarray, List[float]],
                            atm: Atmosphere,
                            srf: 'Surface',
                            __theta: float = None,
-                           cosmic: bool = True) -> Union[float, Tensor2D]:
+                           cosmic: bool = True,
+                           angles: Union[float, np.ndarray] = None) -> Union[float, Tensor2D]:
     """
     Яркостная температура уходящего излучения системы 'атмосфера - подстилающая поверхность'
 
-    :param frequency: частота излучения в ГГц
+    :param frequency: частота излучения в ГГц (число или 1D-массив частот). Для массива частот расчет
+        векторизован, результат имеет последнюю (частотную) ось
     :param atm: объект Atmosphere (атмосфера)
     :param srf: объект Surface (поверхность)
     :param __theta: угол наблюдения в радианах (deprecated)
     :param cosmic: учитывать реликтовый фон
+    :param angles: зенитные углы, рад. (число или 1D-массив) - расчет сразу для всех углов (см. components)
     """
+    # при atm.solver = 'cumulative' - совместный расчет всех составляющих за один проход (см. components)
+    if atm.solver == 'cumulative' or angles is not None:
+        return components(frequency, atm, srf, __theta, cosmic, angles)[0]
+
+    if math.rank(frequency) > 0:
+        frequency = math.as_tensor(frequency)
+        n = atm.frequency_chunk
+        if len(frequency) > n:
+            return np.concatenate([brightness_temperature(frequency[i:i + n], atm, srf, __theta, cosmic)
+                                   for i in range(0, len(frequency), n)], axis=-1)
     tau_exp = math.exp(-1 * atm.opacity.summary(frequency, __theta))
     tb_down = atm.downward.brightness_temperature(frequency, __theta, background=cosmic)
     tb_up = atm.upward.brightness_temperature(frequency, __theta)
@@ -33,7 +49,123 @@ def brightness_temperature(frequency: float,
         assert srf.angle == __theta, 'эти углы должны совпадать'
     r = srf.reflectivity(frequency)
     kappa = 1. - r  # emissivity
-    return math.as_tensor(srf.temperature + 273.15) * kappa * tau_exp + tb_up + r * tb_down * tau_exp
+    T = math.as_tensor(srf.temperature + 273.15)
+    if math.rank(frequency) > 0:
+        T = T[..., None]
+    return T * kappa * tau_exp + tb_up + r * tb_down * tau_exp
+
+
+@profiled('satellite.components', 0)
+def components(frequency: Union[float, np.ndarray, List[float]],
+               atm: Atmosphere,
+               srf: 'Surface',
+               __theta: float = None,
+               cosmic: bool = True,
+               angles: Union[float, np.ndarray] = None) -> Tuple[Union[float, Tensor2D], ...]:
+    """
+    Яркостная температура уходящего излучения системы 'атмосфера - подстилающая поверхность'
+    и ее составляющие. Поглощение в атмосфере рассчитывается один раз для каждой частоты
+    (см. Atmosphere.radiation)
+
+    :param frequency: частота излучения в ГГц (число или 1D-массив частот)
+    :param atm: объект Atmosphere (атмосфера)
+    :param srf: объект Surface (поверхность)
+    :param __theta: угол наблюдения в радианах (deprecated)
+    :param cosmic: учитывать реликтовый фон
+    :param angles: зенитные углы, рад. (число или 1D-массив). Если указаны, поглощение рассчитывается
+        один раз для всех углов (каждый столбец атмосферы - плоскослоистый, atm.angle и srf.angle
+        не учитываются), для каждого угла пересчитываются только секанс и коэффициенты Френеля
+        (поляризация - srf.polarization). Все составляющие имеют угловую ось перед частотной: [..., A, (F)]
+    :return: кортеж значений: 1 - яркостная температура уходящего излучения, 2 - полное поглощение
+        в атмосфере (Нп), 3 - яркостная температура нисходящего излучения (с учетом реликтового фона,
+        если cosmic=True), 4 - яркостная температура восходящего излучения атмосферы,
+        5 - собственное излучение поверхности, ослабленное атмосферой
+    """
+    tau, tb_down, tb_up = atm.radiation(frequency, __theta, angles=angles)
+    tau_exp = math.exp(-1 * tau)
+    if cosmic:
+        tb_down = tb_down + atm.T_cosmic * tau_exp
+    T = math.as_tensor(srf.temperature + 273.15)
+    if angles is not None:
+        polarization = 'H' if srf.polarization in ['H', 'h'] else 'V'
+        r = np.swapaxes(srf.reflectivities(frequency, angles, polarization)[..., 0], -1, -2)   # [..., A, F]
+        if math.rank(frequency) == 0:
+            r = r[..., 0]
+        T = T.reshape(np.shape(T) + (1,) * (1 + (math.rank(frequency) > 0)))
+        tb_surface = T * (1. - r) * tau_exp
+        return tb_surface + tb_up + r * tb_down * tau_exp, tau, tb_down, tb_up, tb_surface
+    if __theta:
+        assert srf.angle == __theta, 'эти углы должны совпадать'
+    r = srf.reflectivity(frequency)
+    kappa = 1. - r  # emissivity
+    if math.rank(frequency) > 0:
+        T = T[..., None]
+    tb_surface = T * kappa * tau_exp
+    return tb_surface + tb_up + r * tb_down * tau_exp, tau, tb_down, tb_up, tb_surface
+
+
+@profiled('satellite.jacobian', 0)
+def jacobian(frequency: Union[float, np.ndarray, List[float]],
+             atm: Atmosphere,
+             srf: 'Surface',
+             __theta: float = None,
+             cosmic: bool = True,
+             dT: float = 0.5, dS: float = 0.5) -> Dict[str, Union[float, Tensor2D, Tensor1D_or_3D]]:
+    """
+    Яркостная температура уходящего излучения и ее производные по параметрам атмосферы в каждом узле
+    высотной сетки и по параметрам поверхности. Все производные рассчитываются за один прямой
+    и один обратный проход (см. Atmosphere.jacobian)
+
+    :param frequency: частота излучения в ГГц (число или 1D-массив частот)
+    :param atm: объект Atmosphere (атмосфера)
+    :param srf: объект Surface (поверхность)
+    :param __theta: угол наблюдения в радианах (deprecated)
+    :param cosmic: учитывать реликтовый фон
+    :param dT: шаг по температуре поверхности для численного дифференцирования отражательной способности, К
+    :param dS: шаг по солености, промили
+    :return: словарь: 'brightness_temperature' - яркостная температура; 'T', 'rho', 'w' - производные
+        по термодинамической температуре (К/град. Цельс.), абсолютной влажности (К/(г/м^3)) и водности
+        (К/(кг/м^3)) в каждом узле, массивы формы [..., (F,) N]; 'surface_temperature', 'salinity' -
+        производные по температуре поверхности и солености (для поверхностей без солености - None)
+    """
+    if __theta:
+        assert srf.angle == __theta, 'эти углы должны совпадать'
+    r = srf.reflectivity(frequency)
+    T = math.as_tensor(srf.temperature + 273.15)
+    if math.rank(frequency) > 0:
+        T = T[..., None]
+    Tc = atm.T_cosmic if cosmic else 0.
+
+    def cotangents(tau, tb_down, tb_up):
+        tau_exp = math.exp(-1 * tau)
+        return -tau_exp * (T * (1. - r) + r * tb_down + 2 * r * Tc * tau_exp), r * tau_exp, 1.
+
+    (tau, tb_down, tb_up), (dT_atm, drho, dw) = atm.jacobian(frequency, cotangents, __theta)
+    tau_exp = math.exp(-1 * tau)
+    tb_down = tb_down + Tc * tau_exp
+    tb = T * (1. - r) * tau_exp + tb_up + r * tb_down * tau_exp
+
+    # производная по отражательной способности и численные производные отражательной способности
+    dr = tau_exp * (tb_down - T)
+
+    def reflectivity(name, value):
+        s = copy.copy(srf)
+        setattr(s, name, value)
+        return np.asarray(s.reflectivity(frequency), dtype=float)
+
+    t = np.asarray(srf.temperature, dtype=float)
+    d_Ts = tau_exp * (1. - r) + dr * (reflectivity('temperature', t + dT) -
+                                      reflectivity('temperature', t - dT)) / (2 * dT)
+    d_S = None
+    if hasattr(srf, 'salinity'):
+        S = np.asarray(srf.salinity, dtype=float)
+        lower = np.maximum(S - dS, 0.)
+        span = S + dS - lower
+        if math.rank(frequency) > 0:
+            span = span[..., None]
+        d_S = dr * (reflectivity('salinity', S + dS) - reflectivity('salinity', lower)) / span
+    return {'brightness_temperature': tb, 'T': dT_atm, 'rho': drho, 'w': dw,
+            'surface_temperature': d_Ts, 'salinity': d_S}
 
 
 def brightness_temperatures(frequencies: Union[np.ndarray, List[float]],
@@ -41,7 +173,8 @@ def brightness_temperatures(frequencies: Union[np.ndarray, List[float]],
                             srf: 'Surface',
                             __theta: float = None,
                             cosmic: bool = True,
-                            n_workers: int = None) -> np.ndarray:
+                            n_workers: int = None,
+                            backend: str = 'process') -> np.ndarray:
     """
     Яркостная температура уходящего излучения системы 'атмосфера - подстилающая поверхность'
 
@@ -50,6 +183,8 @@ def brightness_temperatures(frequencies: Union[np.ndarray, List[float]],
     :param srf: объект Surface (поверхность)
     :param __theta: угол наблюдения в радианах (deprecated)
     :param cosmic: учитывать реликтовый фон
-    :param n_workers: количество потоков для распараллеливания
+    :param n_workers: количество процессов (потоков) для распараллеливания. По умолчанию - число ядер
+    :param backend: 'process' - пул процессов, 'thread' - пул потоков
     """
-    return parallel(frequencies, func=brightness_temperature, args=(atm, srf, __theta, cosmic, ), n_workers=n_workers)
+    return parallel(frequencies, func=brightness_temperature, args=(atm, srf, __theta, cosmic, ),
+                    n_workers=n_workers, backend=backend)
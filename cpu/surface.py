@@ -2,7 +2,9 @@
 from typing import Union
 from cpu.core.types import Tensor2D
 import cpu.core.math as math
+from cpu.core.profiling import profiled
 import cpu.core.static.water.Fresnel as Fresnel
+import cpu.core.static.water.dielectric as dielectric
 import numpy as np
 
 
@@ -48,6 +50,14 @@ class Surface:
     def emissivity(self, frequency: float) -> Union[float, Tensor2D]:
         pass
 
+    def reflectivities(self, frequencies: Union[float, np.ndarray], angles: Union[float, np.ndarray] = None,
+                       polarizations: str = 'HV') -> np.ndarray:
+        pass
+
+    def emissivities(self, frequencies: Union[float, np.ndarray], angles: Union[float, np.ndarray] = None,
+                     polarizations: str = 'HV') -> np.ndarray:
+        return 1. - self.reflectivities(frequencies, angles, polarizations)
+
 
 class SmoothWaterSurface(Surface):
     """
@@ -73,26 +83,64 @@ class SmoothWaterSurface(Surface):
     def salinity(self, val: Union[float, Tensor2D]):
         self._Sw = math.as_tensor(val)
 
-    def reflectivity(self, frequency: float) -> Union[float, Tensor2D]:
+    @profiled('surface.reflectivity', 1)
+    def reflectivity(self, frequency: Union[float, np.ndarray]) -> Union[float, Tensor2D]:
         """
         Расчет отражательной способности
 
-        :param frequency: частота излучения в ГГц
-        :return: коэффициент отражения гладкой водной поверхности
+        :param frequency: частота излучения в ГГц (число или 1D-массив частот)
+        :return: коэффициент отражения гладкой водной поверхности (для массива частот - с последней частотной осью)
         """
+        T, Sw = self._T, self._Sw
+        if math.rank(frequency) > 0:
+            frequency, T, Sw = math.as_tensor(frequency), T[..., None], Sw[..., None]
         if np.isclose(self._theta, 0.):
-            ret = Fresnel.R(frequency, self._T, self._Sw)
+            ret = Fresnel.R(frequency, T, Sw)
         elif self._polarization in ['H', 'h']:
-            ret = Fresnel.R_horizontal(frequency, self._theta, self._T, self._Sw)
+            ret = Fresnel.R_horizontal(frequency, self._theta, T, Sw)
         else:
-            ret = Fresnel.R_vertical(frequency, self._theta, self._T, self._Sw)
+            ret = Fresnel.R_vertical(frequency, self._theta, T, Sw)
         return math.as_tensor(ret)
 
-    def emissivity(self, frequency: float) -> Union[float, Tensor2D]:
+    @profiled('surface.emissivity', 1)
+    def emissivity(self, frequency: Union[float, np.ndarray]) -> Union[float, Tensor2D]:
         """
         Расчет излучательной способности
 
-        :param frequency: частота излучения в ГГц
+        :param frequency: частота излучения в ГГц (число или 1D-массив частот)
         :return: коэффициент излучения гладкой водной поверхности при условии термодинамического равновесия
         """
         return 1. - self.reflectivity(frequency)
+
+    @profiled('surface.reflectivities', 1)
+    def reflectivities(self, frequencies: Union[float, np.ndarray], angles: Union[float, np.ndarray] = None,
+                       polarizations: str = 'HV') -> np.ndarray:
+        """
+        Расчет отражательной способности сразу для набора частот, зенитных углов и поляризаций.
+        Комплексная диэлектрическая проницаемость рассчитывается один раз для каждой частоты
+        (и каждого узла карт температуры и солености) и используется для всех углов и поляризаций
+
+        :param frequencies: частоты излучения в ГГц (число или 1D-массив)
+        :param angles: зенитные углы, рад. (число или 1D-массив). По умолчанию - угол self.angle
+        :param polarizations: строка из символов 'H' и 'V', например, 'HV', 'H', 'VVH'
+        :return: массив [..., F, A, P] - оси карт температуры/солености (если заданы 2D-картами),
+            частоты, углы, поляризации
+        """
+        if angles is None:
+            angles = self._theta
+        f, theta = np.atleast_1d(math.as_tensor(frequencies)), np.atleast_1d(math.as_tensor(angles))
+        T, Sw = self._T[..., None], self._Sw[..., None]
+        epsilon = dielectric.epsilon_complex(f, T, Sw)[..., None]
+        R_h, R_v = Fresnel.R_polarized(None, theta, None, epsilon=epsilon)
+        R = {'H': R_h, 'V': R_v}
+        return math.as_tensor(np.stack([R[p.upper()] for p in polarizations], axis=-1))
+
+    @profiled('surface.emissivities', 1)
+    def emissivities(self, frequencies: Union[float, np.ndarray], angles: Union[float, np.ndarray] = None,
+                     polarizations: str = 'HV') -> np.ndarray:
+        """
+        Расчет излучательной способности для набора частот, зенитных углов и поляризаций (см. reflectivities)
+
+        :return: массив [..., F, A, P]
+        """
+        return 1. - self.reflectivities(frequencies, angles, polarizations)
@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+from typing import Union, List, Tuple, Dict, Any
+import os
+import json
+import tempfile
+import numpy as np
+
+
+"""
+Хранение сцен и результатов расчетов: массивы разбиваются по первой оси на части (.npy),
+описание массивов и метаданные хранятся в index.json. Части читаются через numpy.memmap,
+поэтому срезы массивов загружаются без чтения файлов целиком, а объект Dataset передается
+в рабочие процессы по имени каталога
+"""
+
+
+def _plain(value: Any) -> Any:
+    """
+    :return: значение, приведенное к типам, допустимым в JSON
+    """
+    if isinstance(value, dict):
+        return {str(k): _plain(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_plain(v) for v in value]
+    if isinstance(value, (np.ndarray, np.generic)):
+        return value.tolist()
+    return value
+
+
+class LazyArray:
+    def __init__(self, dataset: 'Dataset', name: str):
+        """
+        Массив набора данных, части которого читаются с диска только при обращении по индексу
+
+        :param dataset: набор данных
+        :param name: имя массива
+        """
+        self.dataset = dataset
+        self.name = name
+
+    @property
+    def __info(self) -> dict:
+        return self.dataset.index['arrays'][self.name]
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        return (sum(self.__info['lengths']), ) + tuple(self.__info['shape'])
+
+    @property
+    def dtype(self) -> np.dtype:
+        return np.dtype(self.__info['dtype'])
+
+    @property
+    def ndim(self) -> int:
+        return len(self.shape)
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    def __getitem__(self, key) -> np.ndarray:
+        """
+        Срез массива. Номера по первой оси - число, срез или массив номеров (логических значений);
+        по остальным осям допустимы любые индексы numpy, применяемые к каждой части
+        """
+        if not isinstance(key, tuple):
+            key = (key, )
+        if not key:
+            key = (slice(None), )
+        first, rest = key[0], key[1:]
+        if first is Ellipsis:
+            first, rest = slice(None), (Ellipsis, ) + rest
+        rows = np.arange(len(self))[first]
+        scalar = np.ndim(rows) == 0
+        rows = np.atleast_1d(rows)
+        offsets = np.cumsum([0] + self.__info['lengths'])
+        chunks = np.searchsorted(offsets, rows, side='right') - 1
+
+        parts = []
+        # последовательные номера из одной части читаются одним обращением
+        bounds = np.flatnonzero(np.diff(chunks)) + 1
+        for run, chunk in zip(np.split(rows, bounds), chunks[np.concatenate([[0], bounds])] if len(rows) else []):
+            local = run - offsets[chunk]
+            if len(local) > 1 and np.all(np.diff(local) == 1):
+                local = slice(int(local[0]), int(local[-1]) + 1)
+            parts.append(np.asarray(self.dataset.chunk(self.name, int(chunk))[(local, ) + rest]))
+        if not parts:
+            return np.empty((0, ) + self.shape[1:], dtype=self.dtype)[(slice(None), ) + rest]
+        out = np.concatenate(parts, axis=0)
+        return out[0] if scalar else out
+
+    def __array__(self, dtype=None) -> np.ndarray:
+        out = self[:]
+        return out if dtype is None else out.astype(dtype)
+
+
+class Dataset:
+    def __init__(self, path: str, mode: str = 'r'):
+        """
+        Набор данных в каталоге path
+
+        :param path: каталог набора данных
+        :param mode: 'r' - только чтение, 'a' - чтение и дописывание (каталог создается при необходимости)
+        """
+        self.path = path
+        self.mode = mode
+        self._chunks = {}
+        if mode == 'a' and not os.path.exists(os.path.join(path, 'index.json')):
+            os.makedirs(path, exist_ok=True)
+            self.index = {'arrays': {}, 'attrs': {}}
+            self.__flush()
+        elif mode in ['r', 'a']:
+            with open(os.path.join(path, 'index.json'), 'r') as file:
+                self.index = json.load(file)
+        else:
+            raise ValueError('mode must be \'r\' or \'a\'')
+
+    def __getstate__(self):
+        # в другие процессы передается только каталог: части массивов открываются заново
+        return {'path': self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'], 'r')
+
+    def __flush(self) -> None:
+        fd, tmp = tempfile.mkstemp(suffix='.json', dir=self.path)
+        with os.fdopen(fd, 'w') as file:
+            json.dump(self.index, file, indent=1)
+        os.replace(tmp, os.path.join(self.path, 'index.json'))
+
+    def __writable(self) -> None:
+        if self.mode != 'a':
+            raise RuntimeError('набор данных открыт только для чтения')
+
+    @property
+    def attrs(self) -> dict:
+        """
+        Метаданные (значения, допустимые в JSON)
+        """
+        return self.index['attrs']
+
+    def set_attrs(self, **attrs) -> None:
+        """
+        Добавить (заменить) метаданные
+        """
+        self.__writable()
+        self.index['attrs'].update(_plain(attrs))
+        self.__flush()
+
+    def keys(self) -> List[str]:
+        return list(self.index['arrays'].keys())
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.index['arrays']
+
+    def __getitem__(self, name: str) -> LazyArray:
+        if name not in self:
+            raise KeyError(name)
+        return LazyArray(self, name)
+
+    def chunk(self, name: str, k: int) -> np.ndarray:
+        """
+        :return: k-я часть массива name (numpy.memmap, только для чтения)
+        """
+        if (name, k) not in self._chunks:
+            self._chunks[(name, k)] = np.load(os.path.join(self.path, name, '{}.npy'.format(str(k).zfill(6))),
+                                              mmap_mode='r')
+        return self._chunks[(name, k)]
+
+    def __rows(self, name: str, array: Union[np.ndarray, List, float]) -> np.ndarray:
+        """
+        Проверка дописываемых строк массива name и приведение к типу массива (без записи на диск)
+        """
+        array = np.asarray(array)
+        if array.dtype == object:
+            raise ValueError('массивы объектов не поддерживаются')
+        if array.ndim == 0:
+            array = array[None]
+        if name not in self:
+            return array
+        info = self.index['arrays'][name]
+        if list(array.shape[1:]) != info['shape']:
+            raise ValueError('форма строк не совпадает с формой массива \'{}\''.format(name))
+        dtype = np.dtype(info['dtype'])
+        if not np.can_cast(array.dtype, dtype, 'same_kind'):
+            raise ValueError('тип {} не приводится к типу {} массива \'{}\''.format(array.dtype, dtype, name))
+        if dtype.kind in 'SU' and array.dtype.itemsize > dtype.itemsize and array.size and \
+                np.char.str_len(array).max() > np.char.str_len(array.astype(dtype)).max():
+            raise ValueError('строки длиннее допустимых для массива \'{}\' ({})'.format(name, dtype))
+        return array.astype(dtype, copy=False)
+
+    def __append(self, columns: Dict[str, np.ndarray], chunk: int = None) -> None:
+        """
+        Запись строк нескольких массивов. Сначала на диск записываются все части, затем индекс
+        обновляется один раз, так что прерванная запись не оставляет массивы разной длины
+        """
+        lengths = {}
+        for name, array in columns.items():
+            os.makedirs(os.path.join(self.path, name), exist_ok=True)
+            k = len(self.index['arrays'][name]['lengths']) if name in self else 0
+            lengths[name] = []
+            step = chunk or max(len(array), 1)
+            for i in range(0, len(array), step):
+                np.save(os.path.join(self.path, name, '{}.npy'.format(str(k).zfill(6))), array[i:i + step])
+                lengths[name].append(len(array[i:i + step]))
+                k += 1
+        for name, array in columns.items():
+            if name not in self:
+                self.index['arrays'][name] = {'dtype': array.dtype.str, 'shape': list(array.shape[1:]), 'lengths': []}
+            self.index['arrays'][name]['lengths'] += lengths[name]
+        self.__flush()
+
+    def append(self, name: str, array: Union[np.ndarray, List], chunk: int = None) -> None:
+        """
+        Дописать строки (элементы по первой оси) в массив name. Если массива нет, он создается.
+        Строки приводятся к типу массива; если это невозможно без потери данных (например, дробные
+        числа в целочисленный массив или строки длиннее допустимых), возникает ValueError
+
+        :param name: имя массива
+        :param array: дописываемые строки
+        :param chunk: макс. число строк в одной части. По умолчанию - все строки в одной части
+        """
+        self.__writable()
+        self.__append({name: self.__rows(name, array)}, chunk)
+
+    def write(self, name: str, array: Union[np.ndarray, List], chunk: int = None) -> None:
+        """
+        Записать массив name (существующий массив с тем же именем заменяется)
+
+        :param name: имя массива
+        :param array: массив
+        :param chunk: макс. число строк (элементов по первой оси) в одной части
+        """
+        self.__writable()
+        if name in self:
+            for k in range(len(self.index['arrays'][name]['lengths'])):
+                self._chunks.pop((name, k), None)
+                os.remove(os.path.join(self.path, name, '{}.npy'.format(str(k).zfill(6))))
+            del self.index['arrays'][name]
+        self.append(name, array, chunk)
+
+    def append_rows(self, **columns: Union[np.ndarray, List, float]) -> None:
+        """
+        Дописать строки в таблицу результатов: каждый столбец - отдельный массив набора данных.
+        Индекс обновляется один раз после записи всех столбцов
+
+        :param columns: значения столбцов (одинаковой длины или числа - для одной строки)
+        """
+        self.__writable()
+        columns = {name: self.__rows(name, value) for name, value in columns.items()}
+        if len({len(a) for a in columns.values()}) > 1:
+            raise ValueError('столбцы разной длины')
+        self.__append(columns)
+
+    def read(self, *names: str) -> Union[np.ndarray, Dict[str, np.ndarray]]:
+        """
+        :return: массив целиком (для одного имени) или словарь {имя: массив}
+        """
+        if len(names) == 1:
+            return self[names[0]][:]
+        return {name: self[name][:] for name in names}
@@ -1,8 +1,9 @@
 #  -*- coding: utf-8 -*-
 
-from typing import Union, Tuple
+from typing import Union, Tuple, List, Dict, Callable
 import numpy as np
-from scipy.signal import convolve2d
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.ndimage import minimum_filter, maximum_filter
 
 
 def __(kernel: Union[Tuple, int]):
@@ -14,38 +15,123 @@ def __(kernel: Union[Tuple, int]):
 
 
 def block_averaging(array2d: np.ndarray, kernel: Union[Tuple, int] = (10, 10), same_size=True) -> np.ndarray:
+    """
+    Усреднение по непересекающимся блокам размера kernel
+
+    :param array2d: 2D-массив
+    :param kernel: размер блока
+    :param same_size: если True, каждый элемент блока (в т.ч. неполных блоков у краев) заменяется средним
+        по блоку в исходном массиве; если False, возвращается массив средних по полным блокам
+    """
     ni, nj = __(kernel)
-    if same_size:
-        for i in range(0, len(array2d), ni):
-            for j in range(0, len(array2d[i]), nj):
-                array2d[i:i + ni, j:j + nj] = np.mean(array2d[i:i + ni, j:j + nj])
-    else:
-        new_arr = np.zeros((len(array2d) // ni, len(array2d[0]) // nj), dtype=float)
-        for i in range(0, len(array2d), ni):
-            for j in range(0, len(array2d[i]), nj):
-                new_arr[i // ni, j // nj] = np.mean(array2d[i:i + ni, j:j + nj])
-        array2d = new_arr
+    si, sj = array2d.shape
+    if not same_size:
+        return np.asarray(array2d[:si // ni * ni, :sj // nj * nj], dtype=float).reshape(
+            si // ni, ni, sj // nj, nj).mean(axis=(1, 3))
+    bi, bj = np.arange(0, si, ni), np.arange(0, sj, nj)
+    sums = np.add.reduceat(np.add.reduceat(np.asarray(array2d, dtype=float), bi, axis=0), bj, axis=1)
+    ci, cj = np.diff(np.append(bi, si)), np.diff(np.append(bj, sj))
+    array2d[:, :] = np.repeat(np.repeat(sums / np.outer(ci, cj), ci, axis=0), cj, axis=1)
     return array2d
 
 
-def conv_averaging(array2d: np.ndarray, kernel: Union[Tuple, int] = (10, 10)) -> np.ndarray:
+def summed_area_table(array2d: np.ndarray) -> np.ndarray:
+    """
+    Таблица накопленных сумм (integral image): элемент [i, j] равен сумме array2d[:i, :j]
+
+    :param array2d: 2D-массив формы (si, sj)
+    :return: 2D-массив формы (si + 1, sj + 1)
+    """
+    si, sj = array2d.shape
+    table = np.zeros((si + 1, sj + 1), dtype=float)
+    np.cumsum(np.cumsum(array2d, axis=0, dtype=float), axis=1, out=table[1:, 1:])
+    return table
+
+
+def box_sum(table: np.ndarray, kernel: Union[Tuple, int] = (10, 10)) -> np.ndarray:
+    """
+    Суммы по всем окнам размера kernel, целиком лежащим внутри массива (mode='valid')
+
+    :param table: таблица накопленных сумм (см. summed_area_table)
+    :param kernel: размер окна
+    :return: 2D-массив формы (si - ni + 1, sj - nj + 1)
+    """
     ni, nj = __(kernel)
-    kernel = np.ones((ni, nj)) / (ni * nj)
-    return convolve2d(array2d, kernel, mode='valid').flatten()
+    return table[ni:, nj:] - table[:-ni, nj:] - table[ni:, :-nj] + table[:-ni, :-nj]
+
+
+def conv_statistics(array2d: np.ndarray, kernels: List[Union[Tuple, int]],
+                    statistics: Union[Tuple[str, ...], List[str]] = ('mean', )) -> List[Dict[str, np.ndarray]]:
+    """
+    Статистики по всем окнам (mode='valid') для списка размеров окон. Таблицы накопленных сумм
+    строятся один раз, после чего каждая статистика для каждого окна рассчитывается за O(si * sj)
+
+    :param array2d: 2D-массив
+    :param kernels: список размеров окон
+    :param statistics: рассчитываемые статистики: 'mean', 'var', 'min', 'max'
+    :return: для каждого размера окна - словарь {статистика: значения по окнам (1D-массив, как в conv_averaging)}
+    """
+    array2d = np.asarray(array2d, dtype=float)
+    shift = np.mean(array2d)    # сдвиг уменьшает потерю точности при расчете дисперсии
+    table = summed_area_table(array2d - shift)
+    table2 = summed_area_table((array2d - shift) ** 2) if 'var' in statistics else None
+    si, sj = array2d.shape
+    out = []
+    for kernel in kernels:
+        ni, nj = __(kernel)
+        stats = {}
+        mean = box_sum(table, kernel) / (ni * nj)
+        for name in statistics:
+            if name == 'mean':
+                stats[name] = (mean + shift).flatten()
+            elif name == 'var':
+                stats[name] = np.maximum(box_sum(table2, kernel) / (ni * nj) - mean * mean, 0.).flatten()
+            elif name in ['min', 'max']:
+                f = minimum_filter if name == 'min' else maximum_filter
+                stats[name] = f(array2d, size=(ni, nj), mode='nearest')[
+                    ni // 2:ni // 2 + si - ni + 1, nj // 2:nj // 2 + sj - nj + 1].flatten()
+            else:
+                raise ValueError('неизвестная статистика \'{}\''.format(name))
+        out.append(stats)
+    return out
+
+
+def conv_averaging(array2d: np.ndarray, kernel: Union[Tuple, int] = (10, 10)) -> np.ndarray:
+    return conv_statistics(array2d, [kernel])[0]['mean']
+
+
+def windows(array2d: np.ndarray, kernel: Union[Tuple, int] = (10, 10)) -> np.ndarray:
+    """
+    Все окна размера kernel, целиком лежащие внутри массива (mode='valid'), без копирования данных
+
+    :param array2d: 2D-массив формы (si, sj)
+    :param kernel: размер окна
+    :return: представление (view, только для чтения) формы (si - ni + 1, sj - nj + 1, ni, nj)
+    """
+    return sliding_window_view(np.asarray(array2d), __(kernel), writeable=False)
 
 
 def conv_cut(array2d: np.ndarray, kernel: Union[Tuple, int] = (10, 10),
-             averaging: bool = False) -> np.ndarray:
+             averaging: bool = False, reduction: Union[str, Callable, None] = None) -> np.ndarray:
+    """
+    Нарезка 2D-массива на окна размера kernel (mode='valid')
+
+    :param array2d: 2D-массив
+    :param kernel: размер окна
+    :param averaging: то же, что reduction='mean'
+    :param reduction: свертка каждого окна: 'mean', 'var', 'min', 'max' (рассчитываются без формирования окон,
+        см. conv_statistics) или функция f(windows, axis) в стиле numpy (например, np.median)
+    :return: без свертки - представление окон (см. windows); со сверткой - 2D-массив значений по окнам
+    """
     ni, nj = __(kernel)
-    si, sj = array2d.shape
-    new_arr = []
-    for i in range(si - ni):
-        for j in range(sj - nj):
-            val = np.asarray(array2d[i:i + ni, j:j + nj]).flatten()
-            if averaging:
-                val = np.mean(val)
-            new_arr.append(val)
-    return np.asarray(new_arr)
+    si, sj = np.shape(array2d)
+    if averaging:
+        reduction = 'mean'
+    if reduction is None:
+        return windows(array2d, kernel)
+    if isinstance(reduction, str):
+        return conv_statistics(array2d, [kernel], (reduction, ))[0][reduction].reshape(si - ni + 1, sj - nj + 1)
+    return reduction(windows(array2d, kernel), axis=(2, 3))
 
 
 def add_zeros(array2d: np.ndarray, bounds: Union[Tuple[int, int], Tuple[int, int, int, int], int]):
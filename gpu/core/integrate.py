@@ -119,3 +119,57 @@ def callable_f(f: Callable, lower: int, upper: int,
     if math.rank(a) == 3:
         a = math.transpose(a, axes=[1, 2, 0])
     return limits(a, lower, upper, dh, method, theta, px, incline, boundaries=boundaries)
+
+
+def __rule(method: str) -> Tuple[float, List[float], float]:
+    """
+    Весовые коэффициенты квадратурной формулы
+
+    :param method: метод интегрирования
+    :return: коэффициент при крайних узлах, коэффициенты при внутренних узлах (в зависимости от остатка
+        от деления номера узла, отсчитанного от нижнего предела, на период формулы), общий знаменатель
+    """
+    if method.lower() == 'trapz':
+        return 1., [2.], 2.
+    if method.lower() == 'simpson':
+        return 1., [2., 4.], 3.
+    return 14., [28., 64., 24., 64.], 45.   # boole
+
+
+def cumulative(a: Tensor1D_or_3D, dh: Union[float, Tensor1D], method='trapz',
+               direction: str = 'up') -> Tensor1D_or_3D:
+    """
+    Интегралы по всем частичным отрезкам [0, h] (direction='up') или [h, N-1] (direction='down')
+    за один проход с помощью накопленных сумм (tf.cumsum). Для каждого h результат совпадает
+    с limits(a, 0, h, ...) или limits(a, h, N-1, ...) соответственно
+
+    :param a: 1D- или 3D-массив (интегрирование по последней оси)
+    :param dh: шаг по высоте (число или 1D-массив), км
+    :param method: метод интегрирования
+    :param direction: 'up' - от нижней границы до уровня h; 'down' - от уровня h до верхней границы
+    :return: массив той же формы, что и a
+    """
+    end, c, den = __rule(method)
+    m = len(c)
+    a = math.as_tensor(a)
+    n = int(a.shape[-1])
+    k = np.arange(n)
+    ad = a * math.as_tensor(dh)
+
+    if direction == 'up':
+        w = np.array([c[i % m] for i in range(n)])
+        w[0] = 0.
+        s = math.cumsum(ad * math.as_tensor(w), axis=-1)
+        interior = math.take(s, np.maximum(k - 1, 0), axis=-1)
+        return (end * (ad[..., :1] + ad) + interior) / den
+
+    if direction == 'down':
+        interior = math.zeros_like(ad)
+        for r in range(m):
+            w = np.array([c[(i - r) % m] for i in range(n)])
+            w[-1] = 0.
+            s = math.cumsum(ad * math.as_tensor(w), axis=-1, reverse=True)
+            interior += math.take(s, np.minimum(k + 1, n - 1), axis=-1) * math.as_tensor(k % m == r)
+        return (end * (ad + ad[..., -1:]) + interior) / den
+
+    raise ValueError('direction must be \'up\' or \'down\'')
@@ -17,6 +17,14 @@ def sum_(a: TensorLike, axis: int = None) -> Union[Number, TensorLike]:
     return tf.reduce_sum(a, axis=axis)
 
 
+def cumsum(a: TensorLike, axis: int = -1, reverse: bool = False) -> TensorLike:
+    return tf.cumsum(a, axis=axis, reverse=reverse)
+
+
+def take(a: TensorLike, indices, axis: int = -1) -> TensorLike:
+    return tf.gather(a, indices, axis=axis)
+
+
 def transpose(a: TensorLike, axes=None) -> TensorLike:
     return tf.transpose(a, perm=axes)
 
@@ -2,7 +2,6 @@
 import os
 import sys
 import warnings
-import dill
 import datetime
 import numpy as np
 from collections import defaultdict
@@ -12,6 +11,7 @@ from gpu.surface import SmoothWaterSurface
 from cpu.cloudiness import Plank3D, Cloudiness3D
 import gpu.satellite as satellite
 from cpu.utils import map2d
+from cpu.utils.dataset import Dataset
 from cpu.atmosphere import Atmosphere as cpuAtm
 from cpu.atmosphere import avg
 from cpu.weight_funcs import krho
@@ -35,11 +35,45 @@ def append_stats(dest, arr, key):
     dest['range'][key].append(np.max(arr) - np.min(arr))
 
 
+# столбцы таблицы результатов (см. ieee/unify.py)
+keys = ['name', 'seed', 'required_percentage', 'K', 'alpha', 'Dm', 'd_min', 'eta', 'beta', 'cl_bottom', 'xi',
+        'cover_percentage', 'cover_percentage_d', 'sky_cover', 'sky_cover_d', 'n_analytical', 'n_fact']
+stats = ['mean', 'min', 'max', 'var', 'std', 'range']
+groups = [('brightness_temperature', ['BRTC', 'SOLD', 'DTSB']),
+          ('W', ['WBRT', 'WSOL', 'DWSB', 'DWBI', 'DWSI', 'DWSBI', 'DWBII', 'DWSII'])]
+
+
+def table(data: dict) -> dict:
+    """
+    Строки таблицы результатов одного расчета: по одной строке на каждую пару (ядро усреднения, частота)
+    """
+    kernels, frequencies = np.asarray(data['kernels']), list(data['frequencies'])
+    k = np.repeat(np.arange(len(kernels)), len(frequencies))
+    nu = [frequencies[j] for j in np.tile(np.arange(len(frequencies)), len(kernels))]
+    rows = {key: np.full(len(k), data[key]) for key in keys}
+    rows['name'] = np.full(len(k), data['name'], dtype='U16')   # более длинные имена - ValueError в Dataset
+    rows['part'] = np.full(len(k), data['part'])
+    rows['w_total_max'] = np.full(len(k), data['W']['total_max'])
+    rows['kernel_nodes'] = kernels[k]
+    rows['kernel_km'] = kernels[k].astype(int) // 6
+    for t in stats:
+        rows['WINI_{}'.format(t)] = np.asarray(data['W']['WINI'][t])[k]
+    rows['freq'] = np.asarray(nu, dtype=float)
+    for group, names in groups:
+        for name in names:
+            for t in stats:
+                rows['{}_{}'.format(name, t)] = np.asarray([data[group][name][t][f][i] for i, f in zip(k, nu)])
+    return rows
+
+
 if __name__ == '__main__':
     # project folder
     folder = 'ieee'
     if not os.path.exists(folder):
         os.makedirs(folder)
+    # таблица результатов: строки дописываются после каждого расчета
+    results = Dataset(os.path.join(folder, 'results'), 'a')
+    done = set(zip(results.read('name').tolist(), results.read('part').tolist())) if 'name' in results else set()
 
     #########################################################################
     # domain parameters
@@ -150,7 +184,7 @@ if __name__ == '__main__':
         print('xi\t', xi)
 
         for ID, required_percentage in enumerate(percentage):
-            if os.path.exists(os.path.join(folder, '{}_{}.part'.format(distr['name'], str(ID).zfill(4)))):
+            if (distr['name'], ID) in done:
                 continue
             print('\n\nRequired %: {:.2f}'.format(required_percentage * 100.))
             K = 2 * np.power(alpha, 3) * (X * X * required_percentage) / (np.pi * xi)
@@ -318,7 +352,6 @@ if __name__ == '__main__':
             data = {
                 'name': distr['name'],
                 'part': ID,
-                'filename': '{}_{}.part'.format(distr['name'], str(ID).zfill(4)),
 
                 'H': H,
                 'd': d,
@@ -395,5 +428,4 @@ if __name__ == '__main__':
                 }
             }
 
-            with open(os.path.join(folder, data['filename']), 'wb') as dump:
-                dill.dump(data, dump)
+            results.append_rows(**table(data))
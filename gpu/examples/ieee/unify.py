@@ -22,8 +22,7 @@
 #     'DTSB': DTSB,
 # }
 
-import glob
-import dill
+from cpu.utils.dataset import Dataset
 
 
 keys = ['name', 'seed', 'required_percentage', 'K', 'alpha', 'Dm', 'd_min', 'eta', 'beta', 'cl_bottom', 'xi',
@@ -31,79 +30,19 @@ keys = ['name', 'seed', 'required_percentage', 'K', 'alpha', 'Dm', 'd_min', 'eta
 
 stats = ['mean', 'min', 'max', 'var', 'std', 'range']
 
-with open('db.txt', 'w') as db:
-
-    s = ' '.join(keys + ['w_total_max', 'kernel_nodes', 'kernel_km']
-                      + ['WINI_{}'.format(t) for t in stats]
-                      + ['freq']
-
-                      + ['BRTC_{}'.format(t) for t in stats] + ['SOLD_{}'.format(t) for t in stats]
-                      + ['DTSB_{}'.format(t) for t in stats]
+columns = keys + ['w_total_max', 'kernel_nodes', 'kernel_km'] \
+    + ['WINI_{}'.format(t) for t in stats] \
+    + ['freq'] \
+    + ['{}_{}'.format(name, t) for name in ['BRTC', 'SOLD', 'DTSB'] for t in stats] \
+    + ['{}_{}'.format(name, t) for name in ['WBRT', 'WSOL', 'DWSB', 'DWBI', 'DWSI', 'DWSBI', 'DWBII', 'DWSII']
+       for t in stats]
 
-                      + ['WBRT_{}'.format(t) for t in stats] + ['WSOL_{}'.format(t) for t in stats]
-                      + ['DWSB_{}'.format(t) for t in stats]
-                      + ['DWBI_{}'.format(t) for t in stats] + ['DWSI_{}'.format(t) for t in stats]
-                      + ['DWSBI_{}'.format(t) for t in stats]
-                      + ['DWBII_{}'.format(t) for t in stats] + ['DWSII_{}'.format(t) for t in stats]
-                 )
-    db.write(s + '\n')
+# таблица результатов, которую дописывает ieee.py (по строке на каждую пару (ядро усреднения, частота))
+table = Dataset('results').read(*columns)
+N = len(table['name'])
 
-    parts = glob.glob('*.part')
-    N = len(parts)
-    for i, fname in enumerate(parts):
+with open('db.txt', 'w') as db:
+    db.write(' '.join(columns) + '\n')
+    for i in range(N):
         print('\r{:.2f}%'.format((i + 1) / N * 100.), end='  ', flush=True)
-        with open(fname, 'rb') as file:
-            data = dill.load(file)
-
-            s_init = ''
-            for key in keys:
-                s_init += '{} '.format(data[key])
-
-            s_init += '{} '.format(data['W']['total_max'])
-
-            frequencies = data['frequencies']
-            kernels = data['kernels']
-            for k, kernel in enumerate(kernels):
-                s_pre = s_init
-                s_pre += '{} '.format(kernel)
-                s_pre += '{} '.format(int(kernel) // 6)
-
-                for key in stats:
-                    s_pre += '{} '.format(data['W']['WINI'][key][k])
-
-                for nu in frequencies:
-                    s = s_pre
-                    s += '{} '.format(nu)
-
-                    for key in stats:
-                        s += '{} '.format(data['brightness_temperature']['BRTC'][key][nu][k])
-
-                    for key in stats:
-                        s += '{} '.format(data['brightness_temperature']['SOLD'][key][nu][k])
-
-                    for key in stats:
-                        s += '{} '.format(data['brightness_temperature']['DTSB'][key][nu][k])
-
-                        ##########################################################################
-
-                    for key in stats:
-                        s += '{} '.format(data['W']['WBRT'][key][nu][k])
-
-                    for key in stats:
-                        s += '{} '.format(data['W']['WSOL'][key][nu][k])
-
-                    for key in stats:
-                        s += '{} '.format(data['W']['DWSB'][key][nu][k])
-
-                    for key in stats:
-                        s += '{} '.format(data['W']['DWBI'][key][nu][k])
-                    for key in stats:
-                        s += '{} '.format(data['W']['DWSI'][key][nu][k])
-                    for key in stats:
-                        s += '{} '.format(data['W']['DWSBI'][key][nu][k])
-                    for key in stats:
-                        s += '{} '.format(data['W']['DWBII'][key][nu][k])
-                    for key in stats:
-                        s += '{} '.format(data['W']['DWSII'][key][nu][k])
-
-                    db.write(s + '\n')
+        db.write(''.join('{} '.format(table[column][i]) for column in columns) + '\n')
@@ -5,6 +5,7 @@ from gpu.atmosphere import Atmosphere
 from cpu.cloudiness import Cloudiness3D
 from gpu.surface import SmoothWaterSurface
 import gpu.satellite as satellite
+from cpu.utils.dataset import Dataset
 import dill
 import os
 import numpy as np
@@ -172,8 +173,9 @@ print('\nDBRT ', DBRT_tensor.shape)
 print('OBRT ', OBRT_tensor.shape)
 
 print('\nShaping dataset...')
-with open('dataset.bin', 'wb') as dump:
-    dill.dump((T_tensor, P_tensor, rho_tensor, __grid,
-               surfaceT_tensor, surfaceP_tensor, surfaceRho_tensor,
-               DBRT_tensor, OBRT_tensor, Q_tensor, W_tensor),
-              dump, recurse=True)
+dataset = Dataset('dataset', 'a')
+for name, tensor in [('T', T_tensor), ('P', P_tensor), ('rho', rho_tensor), ('grid', __grid),
+                     ('surfaceT', surfaceT_tensor), ('surfaceP', surfaceP_tensor), ('surfaceRho', surfaceRho_tensor),
+                     ('DBRT', DBRT_tensor), ('OBRT', OBRT_tensor), ('Q', Q_tensor), ('W', W_tensor)]:
+    dataset.write(name, np.asarray(tensor), chunk=64)
+dataset.set_attrs(frequencies=frequencies)